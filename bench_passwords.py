@@ -0,0 +1,67 @@
+"""Benchmark login throughput of the password hashing pool
+
+Simulates a login storm: client threads call verify() as fast as they can
+for a few seconds, for several pool sizes.  Reports successful logins per
+second, latency and how many attempts were shed with HasherBusy (the 503
+path).  Run with: python bench_passwords.py [seconds]
+"""
+import os
+import statistics
+import sys
+import threading
+import time
+
+from blog_passwords import HasherBusy, PasswordHasher, hash_password
+
+CLIENTS = 64
+
+
+def run(workers, seconds, stored):
+    hasher = PasswordHasher(workers=workers)
+    hasher.start()
+    latencies, rejected = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                matches, _ = hasher.verify('correct horse', stored)
+                assert matches
+            except HasherBusy:
+                with lock:
+                    rejected[0] += 1
+                time.sleep(0.01)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    hasher.shutdown()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f'workers={workers:<3} max_pending={hasher.max_pending:<4} logins/s={len(latencies) / elapsed:7.1f} '
+          f'p50={p50:6.1f}ms p95={p95:6.1f}ms shed={rejected[0]}')
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    stored = hash_password('correct horse')
+    cpus = os.cpu_count() or 1
+    sizes = sorted({1, 2, 4, cpus})
+    print(f'{CLIENTS} client threads, {cpus} CPUs, {seconds:.0f}s per run')
+    for workers in sizes:
+        run(workers, seconds, stored)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark the blog search index
+
+Builds a synthetic corpus (100k posts by default), indexes it one post at a
+time the way new_post does, then times a mix of term, phrase and tag
+queries.  Run with: python bench_search.py [num_posts]
+"""
+import random
+import statistics
+import sys
+import time
+
+from blog_search import SearchIndex
+
+VOCABULARY = [f'word{i}' for i in range(20000)]
+TAGS = [f'tag{i}' for i in range(200)]
+# Zipf-like weights so a few words are common and most are rare
+WEIGHTS = [1.0 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def make_post(rng, i):
+    words = rng.choices(VOCABULARY, weights=WEIGHTS, k=80)
+    return {
+        'id': str(i),
+        'title': ' '.join(words[:6]),
+        'content': ' '.join(words[6:]),
+        'tags': rng.sample(TAGS, 3),
+        'author_name': 'bench',
+        'created_at': '2024-01-01 00:00:00',
+    }
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+    posts = [make_post(rng, i) for i in range(count)]
+
+    # Caching is off while measuring so every query does the full work
+    index = SearchIndex(cache_size=0)
+    start = time.perf_counter()
+    for post in posts:
+        index.add(post)
+    elapsed = time.perf_counter() - start
+    print(f'indexed {count} posts in {elapsed:.2f}s ({count / elapsed:,.0f} posts/s)')
+
+    queries = {
+        'common term': 'word1',
+        'two terms': 'word3 word40',
+        'rare term': 'word15000',
+        'phrase': f'"{posts[123]["title"].split()[0]} {posts[123]["title"].split()[1]}"',
+        'term + tag': 'word5 tag:tag7',
+    }
+    for label, query in queries.items():
+        total = index.search(query)['total']
+        p50, p95 = timed(lambda: index.search(query), 50)
+        print(f'{label:12} {query!r:32} matches={total:<7} p50={p50:.2f}ms p95={p95:.2f}ms')
+
+    index.cache_size = 256
+    p50, p95 = timed(lambda: index.search(queries['common term']), 200)
+    print(f'repeated query served from the result cache p50={p50:.3f}ms p95={p95:.3f}ms')
+
+    p50, p95 = timed(lambda: index.add(make_post(rng, rng.randrange(count))), 200)
+    print(f'incremental reindex of one post p50={p50:.3f}ms p95={p95:.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark the blog event log
+
+Measures durable write throughput (concurrent writers sharing fsyncs) and
+cold-start recovery of a store holding 1M comments, both from a snapshot
+and from replaying the log tail.  Run with: python bench_storage.py
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from blog_storage import EventLog, bulk_load
+from blog_store import PostStore
+
+POSTS = 1000
+COMMENTS_PER_POST = 1000
+WRITERS = 16
+WRITES_PER_WRITER = 500
+# Records logged after the last snapshot (the app snapshots every 50k)
+TAIL = 50000
+
+
+def make_post(i):
+    return {
+        'id': f'post-{i}', 'title': f'Post {i}', 'content': 'Benchmark post body',
+        'author_id': '1', 'author_name': 'admin', 'tags': ['bench'], 'status': 'published',
+        'created_at': '2024-01-01 00:00:00', 'updated_at': '2024-01-01 00:00:00',
+        'views': 0, 'likes': 0,
+    }
+
+
+def make_comment(post_id, n):
+    return {'id': f'{post_id}-c{n}', 'content': 'Nice post!', 'author': 'john_doe',
+            'author_id': '2', 'created_at': '2024-01-01 00:00:01'}
+
+
+def open_store(directory, snapshot_every=10**9):
+    log = EventLog(directory, snapshot_every=snapshot_every)
+    store = PostStore()
+    with bulk_load():
+        state, records = log.load()
+        if state is not None:
+            bodies = log.snapshot_blobs()
+            for post in state['posts']:
+                _, (post['content'], comments) = next(bodies)
+                store.add(post, comments=comments)
+        for record in records:
+            if record['op'] == 'post_added':
+                store.add(record['post'], comments=record['comments'])
+            elif record['op'] == 'comment_added':
+                store.add_comment(record['post_id'], record['comment'])
+    store.journal = log.record_post_event
+    return log, store
+
+
+def capture(store):
+    def capture_state(rotate):
+        with store.lock:
+            segment = rotate()
+            all_posts = store.all()
+            state = {'posts': [dict(p) for p in all_posts], 'users': []}
+            bodies = store.snapshot_bodies(all_posts)
+        return segment, state, bodies
+    return capture_state
+
+
+def bench_durable_writes(directory):
+    log, store = open_store(directory)
+    store.add(make_post('w'))
+
+    def writer(w):
+        for n in range(WRITES_PER_WRITER):
+            store.add_comment('post-w', make_comment(f'w{w}', n))
+            log.sync()
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(WRITERS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = WRITERS * WRITES_PER_WRITER
+    print(f'durable writes: {total} comments from {WRITERS} threads, each waiting for fsync: '
+          f'{total / elapsed:,.0f} writes/s')
+    log.close()
+
+
+def bench_recovery(directory):
+    log, store = open_store(directory)
+    start = time.perf_counter()
+    for i in range(POSTS):
+        store.add(make_post(i))
+    for n in range(COMMENTS_PER_POST):
+        for i in range(POSTS):
+            store.add_comment(f'post-{i}', make_comment(f'post-{i}', n))
+    log.sync()
+    elapsed = time.perf_counter() - start
+    total = POSTS * COMMENTS_PER_POST
+    print(f'buffered writes: {total:,} comments logged in {elapsed:.2f}s ({total / elapsed:,.0f}/s)')
+    print(f'cold start by replaying {total:,} log records: {recover_in_new_process(directory)}')
+
+    start = time.perf_counter()
+    log.snapshot(capture(store))
+    print(f'snapshot written in {time.perf_counter() - start:.2f}s')
+    for i in range(TAIL):
+        store.add_comment(f'post-{i % POSTS}', make_comment('tail', i))
+    log.close()
+    print(f'cold start from snapshot + {TAIL // 1000}k-record log tail: {recover_in_new_process(directory)}')
+
+
+def recover_in_new_process(directory):
+    """Time startup in a fresh interpreter, as a restarted server would see it"""
+    result = subprocess.run([sys.executable, __file__, '--recover', directory],
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def recover(directory):
+    start = time.perf_counter()
+    log, store = open_store(directory)
+    elapsed = time.perf_counter() - start
+    comments = sum(p['comment_count'] for p in store.all())
+    print(f'{elapsed:.2f}s ({comments:,} comments restored)')
+    log.close()
+
+
+def main():
+    if sys.argv[1:2] == ['--recover']:
+        recover(sys.argv[2])
+        return
+    for bench in (bench_durable_writes, bench_recovery):
+        directory = tempfile.mkdtemp(prefix='blog-bench-')
+        try:
+            bench(directory)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
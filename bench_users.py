@@ -0,0 +1,64 @@
+"""Benchmark user lookups for login and registration
+
+Fills a UserDirectory with 1M users (by default) and times the lookups
+login does and the check-and-insert register does, next to the linear
+scans they replaced.  Password hashing is left out; see bench_passwords.py.
+Run with: python bench_users.py [num_users]
+"""
+import random
+import statistics
+import sys
+import time
+
+from blog_users import DuplicateUser, UserDirectory
+
+
+def make_user(i):
+    return {'id': str(i), 'username': f'User{i}', 'email': f'user{i}@example.com',
+            'password_hash': '', 'role': 'user', 'created_at': '2024-01-01'}
+
+
+def timed(fn, args):
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(7)
+    directory = UserDirectory()
+    start = time.perf_counter()
+    for i in range(count):
+        directory.add(make_user(i))
+    print(f'loaded {count:,} users in {time.perf_counter() - start:.2f}s')
+
+    names = [f'user{rng.randrange(count)}' for _ in range(10000)]
+    p50, p99 = timed(directory.by_username, names)
+    print(f'login lookup (case-insensitive): p50={p50:.2f}us p99={p99:.2f}us')
+
+    def register(i):
+        try:
+            directory.add(make_user(i))
+        except DuplicateUser:
+            pass
+    new_ids = range(count, count + 10000)
+    p50, p99 = timed(register, new_ids)
+    print(f'register check-and-insert:       p50={p50:.2f}us p99={p99:.2f}us')
+    p50, p99 = timed(register, range(100))
+    print(f'register of a taken username:    p50={p50:.2f}us p99={p99:.2f}us')
+
+    # The old code: next(u for u in users if u['username'] == username)
+    users = list(directory)
+    def scan(name):
+        return next((u for u in users if u['username'] == name), None)
+    p50, p99 = timed(scan, [f'User{rng.randrange(count)}' for _ in range(20)])
+    print(f'previous linear scan, for comparison: p50={p50 / 1000:.1f}ms p99={p99 / 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
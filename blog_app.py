@@ -1,14 +1,84 @@
-from flask import Flask, request, jsonify, render_template_string, redirect, flash, session
+from flask import Flask, Response, request, jsonify, render_template, redirect, flash, send_file, session
 from datetime import datetime
+import atexit
+import itertools
+import os
 import uuid
 import hashlib
+from urllib.parse import unquote, urlencode
+
+from markupsafe import Markup
+
+from blog_bulk import export_posts, import_posts, read_lines
+from blog_attachments import AttachmentStore, AttachmentTooLarge
+from blog_authors import AuthorStats
+from blog_bodies import BodyStore
+from blog_cache import FragmentCache, PageCache
+from blog_counters import ViewCounter
+from blog_events import Broadcaster
+from blog_feeds import FeedCache, render_atom, render_rss
+from blog_hll import UniqueViewers
+from blog_jobs import JobQueue
+from blog_json import stream_records, wants_ndjson
+from blog_passwords import HasherBusy, PasswordHasher, hash_password
+from blog_ratelimit import RateLimitPolicy, TokenBucketLimiter
+from blog_related import RelatedPosts
+from blog_scheduler import PublishScheduler, parse_publish_at
+from blog_search import SearchIndex
+from blog_stats import BlogStats
+from blog_storage import EventLog, EventLogFailed, bulk_load
+from blog_trending import TrendingRanking
+from blog_users import DuplicateUser, UserDirectory
+from blog_versions import VersionTracker, not_modified, set_validators
+from blog_store import POST_STATUSES, PostStore
 
 app = Flask(__name__)
 app.secret_key = 'blog-secret-key-here'
 
-# In-memory storage
-posts = []
-users = [
+# Default and maximum number of posts per page
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# Per-route request limits: a token bucket per client IP and, for logged-in
+# users, per session; rates are tokens per second
+RATE_LIMITS = {
+    'comment': RateLimitPolicy(per_ip=TokenBucketLimiter(rate=20 / 60, burst=20),
+                               per_session=TokenBucketLimiter(rate=5 / 60, burst=5)),
+    'login': RateLimitPolicy(per_ip=TokenBucketLimiter(rate=10 / 60, burst=10)),
+    'register': RateLimitPolicy(per_ip=TokenBucketLimiter(rate=5 / 3600, burst=5)),
+}
+
+# Where the event log and snapshots are kept
+DATA_DIR = os.environ.get('BLOG_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blog_data'))
+
+# Comments shown with a post, and per request of /api/posts/<post_id>/comments
+COMMENT_PAGE_SIZE = 20
+
+# Entries per Atom/RSS feed
+FEED_SIZE = 20
+
+# Memory for post content and comments; colder posts are paged out to a
+# scratch file in DATA_DIR and read back on demand
+BODY_CACHE_BYTES = int(os.environ.get('BLOG_BODY_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Attachment uploads: size limit, accepted types (no SVG or HTML, which
+# could carry scripts) and how long browsers may cache the immutable files
+MAX_ATTACHMENT_BYTES = 20 * 1024 * 1024
+ATTACHMENT_TYPES = frozenset((
+    'image/png', 'image/jpeg', 'image/gif', 'image/webp',
+    'application/pdf', 'text/plain', 'application/zip', 'application/octet-stream',
+))
+ATTACHMENT_MAX_AGE = 365 * 24 * 3600
+
+# In-memory storage, rebuilt from the event log at startup
+post_bodies = BodyStore(DATA_DIR, max_bytes=BODY_CACHE_BYTES)
+posts = PostStore(bodies=post_bodies)
+users = UserDirectory()
+event_log = EventLog(DATA_DIR)
+attachments = AttachmentStore(os.path.join(DATA_DIR, 'attachments'), max_bytes=MAX_ATTACHMENT_BYTES)
+
+# Accounts created on first start
+sample_users = [
     {
         "id": "1",
         "username": "admin",
@@ -27,6 +97,128 @@ users = [
     }
 ]
 
+# Work that a write triggers but its response need not wait for: search
+# and related-post indexing, and live notifications
+jobs = JobQueue(workers=4, max_pending=10000)
+
+# Post fields that search or related posts are built from
+INDEXED_FIELDS = frozenset(('title', 'content', 'tags', 'status'))
+
+def index_post(post_id):
+    """Job: bring the search index and related posts in line with a post"""
+    post = posts.get(post_id)
+    if post is not None and post['status'] == 'published':
+        search_index.add(post)
+        related_posts.add(post)
+    else:
+        search_index.remove(post_id)
+        related_posts.remove(post_id)
+
+def index_posts(post_ids):
+    """Job: index a bulk-imported batch of posts in one go"""
+    published = [post for post in map(posts.get, post_ids) if post is not None and post['status'] == 'published']
+    search_index.add_many(published)
+    related_posts.add_many(published)
+
+jobs.register('index_post', index_post)
+jobs.register('index_posts', index_posts)
+
+def queue_index_jobs(event, post, **extra):
+    """PostStore listener: leave indexing to the job queue, one job per post"""
+    if event == 'post_added' or (event == 'post_updated' and INDEXED_FIELDS.intersection(extra['fields'])):
+        # Keyed by post, so a burst of edits is indexed once
+        jobs.enqueue('index_post', post['id'], key=post['id'])
+    elif event == 'posts_added':
+        jobs.enqueue('index_posts', [added['id'] for added in extra['posts']])
+
+# Derived state, kept up to date by the post store; search and related
+# posts are updated by jobs, the cheap counters and caches inline
+search_index = SearchIndex(content=lambda post_id: posts.content(post_id, promote=False))
+related_posts = RelatedPosts(k=5)
+posts.subscribe(queue_index_jobs)
+site_stats = BlogStats()
+posts.subscribe(site_stats.on_store_event)
+versions = VersionTracker()
+posts.subscribe(versions.on_store_event)
+author_stats = AuthorStats(k=5)
+posts.subscribe(author_stats.on_store_event)
+# Subscribed once the data is loaded (see below)
+trending = TrendingRanking(half_life=24 * 3600.0)
+
+# Whole home pages as anonymous visitors see them, plain and gzipped
+page_cache = PageCache(max_bytes=32 * 1024 * 1024)
+
+def invalidate_pages(event, post, **extra):
+    """PostStore listener: drop cached pages showing what just changed"""
+    if event in ('views_added', 'post_liked', 'post_unliked'):
+        # Only the cards showing this post change
+        page_cache.invalidate(('post', post['id']))
+    elif event == 'posts_added':
+        # Every page carries 'stats', so a bulk import drops them all once
+        page_cache.invalidate('stats')
+    else:
+        # New posts and comments also move the sidebar totals and tags
+        page_cache.invalidate('stats', ('post', post['id']))
+
+posts.subscribe(invalidate_pages)
+
+# Rendered Atom/RSS feeds, dropped only when a post they list changes
+feed_cache = FeedCache(max_entries=1024)
+posts.subscribe(feed_cache.on_store_event)
+
+# Live post and comment events for Server-Sent Event streams, sent from
+# jobs that all share one key so they go out in order
+broadcaster = Broadcaster(max_queue=64)
+jobs.register('broadcast', broadcaster.publish, retries=0, coalesce=False)
+
+def publish_events(event, post, **extra):
+    """PostStore listener: queue newly published posts and comments for open streams"""
+    published = post is not None and post['status'] == 'published'
+    if published and (event == 'post_added' or 'status' in extra.get('previous', {})):
+        jobs.enqueue('broadcast', ['posts'], 'post', {
+            'id': post['id'],
+            'title': post['title'],
+            'author_name': post['author_name'],
+            'tags': post['tags'],
+            'created_at': post['created_at']
+        }, key='events')
+    elif event == 'posts_added':
+        # One notice per imported batch rather than a frame per post
+        jobs.enqueue('broadcast', ['posts'], 'posts_imported', {'count': len(extra['posts'])}, key='events')
+    elif event == 'comment_added' and published:
+        jobs.enqueue('broadcast', [('post', post['id']), 'comments'], 'comment',
+                     dict(extra['comment'], post_id=post['id']), key='events')
+
+posts.subscribe(publish_events)
+
+# Scheduled posts are flipped to published by a timer thread, started once
+# the data is loaded
+def publish_scheduled(post_id, due):
+    """Scheduler callback: publish a post if it is still scheduled for `due`"""
+    with posts.lock:
+        post = posts.get(post_id)
+        if post is None or post['status'] != 'scheduled' or parse_publish_at(post['publish_at']) != due:
+            return False
+        # Listed by the time it was published rather than when it was written
+        posts.update(post_id, status='published', created_at=post['publish_at'], updated_at=post['publish_at'])
+    event_log.sync()
+    return True
+
+publish_scheduler = PublishScheduler(publish_scheduled)
+posts.subscribe(publish_scheduler.on_store_event)
+
+# Password hashing runs in worker processes; the workers are forked now,
+# before any threads start or data is loaded
+password_hasher = PasswordHasher(workers=int(os.environ.get('BLOG_HASH_WORKERS', 0)) or None)
+password_hasher.start()
+# Compared against when the username is unknown so timing does not reveal it
+DUMMY_PASSWORD_HASH = hash_password('')
+
+# Post views are counted per thread and written to the posts once a second
+view_counter = ViewCounter(posts.add_views, interval=1.0)
+# Distinct viewers per post, estimated in a fixed 1 KB sketch per post
+unique_viewers = UniqueViewers()
+
 # Sample posts
 sample_posts = [
     {
@@ -37,11 +229,12 @@ sample_posts = [
         "author_name": "admin",
         "tags": ["python", "flask", "web-development"],
         "status": "published",
+        "publish_at": None,
         "created_at": "2024-01-15 10:00:00",
         "updated_at": "2024-01-15 10:00:00",
         "views": 150,
         "likes": 25,
-        "comments": []
+        "comment_count": 0
     },
     {
         "id": "2",
@@ -51,15 +244,120 @@ sample_posts = [
         "author_name": "john_doe", 
         "tags": ["api", "rest", "flask", "python"],
         "status": "published",
+        "publish_at": None,
         "created_at": "2024-01-16 14:30:00",
         "updated_at": "2024-01-16 14:30:00",
         "views": 89,
         "likes": 12,
-        "comments": []
+        "comment_count": 0
     }
 ]
 
-posts.extend(sample_posts)
+def add_user(user):
+    """Add a user account and record it in the event log
+
+    Raises DuplicateUser if the username or email is already registered.
+    """
+    users.add(user)
+    site_stats.add_user()
+    versions.bump('users')
+    page_cache.invalidate('stats')
+    return event_log.append({'op': 'user_registered', 'user': user})
+
+def apply_record(record):
+    """Replay one event log record into the in-memory state"""
+    op = record['op']
+    if op == 'post_added':
+        posts.add(record['post'], comments=record.get('comments'))
+    elif op == 'posts_added':
+        comments = record['comments']
+        posts.add_many([(post, comments.get(post['id'])) for post in record['posts']])
+    elif op == 'comment_added':
+        posts.add_comment(record['post_id'], record['comment'])
+    elif op == 'post_updated':
+        posts.update(record['post_id'], **record['fields'])
+    elif op == 'views_added':
+        posts.add_views({record['post_id']: record['count']})
+    elif op in ('post_liked', 'post_unliked'):
+        member = users.number(record['user_id'])
+        if member is not None:
+            posts.set_liked(record['post_id'], record['user_id'], member, liked=op == 'post_liked')
+    elif op == 'viewer_seen':
+        unique_viewers.merge_register(record['post_id'], record['register'], record['rank'])
+    elif op == 'password_changed':
+        users.set_password_hash(record['user_id'], record['password_hash'])
+    elif op == 'user_registered':
+        # Registration is not ordered with snapshots, so it may be replayed twice
+        if users.restore(record['user']):
+            site_stats.add_user()
+
+def capture_state(rotate):
+    """Snapshot source: switch log segments and copy the state in one step
+
+    Post bodies are only located under the lock; they are pickled, or
+    copied straight out of the spill file, as the snapshot is written.
+    """
+    with posts.lock:
+        segment = rotate()
+        all_posts = posts.all()
+        state = {
+            'posts': [dict(post) for post in all_posts],
+            'users': list(users),
+            'likes': {post_id: [users.by_number(member)['id'] for member in members]
+                      for post_id, members in posts.likes().items()},
+            'viewers': unique_viewers.export(),
+        }
+        bodies = posts.snapshot_bodies(all_posts)
+    return segment, state, bodies
+
+def load_data():
+    """Rebuild posts and users from the snapshot and log, seeding a fresh store"""
+    with bulk_load():
+        state, records = event_log.load()
+        if state is not None:
+            for user in state['users']:
+                users.restore(user)
+                site_stats.add_user()
+            # Older snapshots kept bodies in the state; newer ones stream them
+            # in post order after it, so only one is unpickled at a time
+            comments = state.get('comments', {})
+            bodies = event_log.snapshot_blobs()
+            for post in state['posts']:
+                post_comments = comments.get(post['id'])
+                if 'content' not in post:
+                    _, (post['content'], post_comments) = next(bodies)
+                posts.add(post, comments=post_comments)
+            for post_id, user_ids in state.get('likes', {}).items():
+                posts.load_likes(post_id, [users.number(user_id) for user_id in user_ids])
+            for post_id, registers in state.get('viewers', {}).items():
+                unique_viewers.load(post_id, registers)
+        for record in records:
+            apply_record(record)
+
+    posts.journal = event_log.record_post_event
+    event_log.snapshot_source = capture_state
+    if state is None and not records:
+        for user in sample_users:
+            add_user(user)
+        for sample_post in sample_posts:
+            posts.add(sample_post)
+        event_log.sync()
+
+load_data()
+# Log records carry no timestamps, so trending scores are seeded from the
+# loaded totals instead of being replayed
+trending.rebuild(posts.all())
+posts.subscribe(trending.on_store_event)
+view_counter.start()
+publish_scheduler.start()
+attachments.start()
+# Until now jobs ran inline, so the loaded posts are already indexed
+jobs.start()
+atexit.register(event_log.close)
+atexit.register(publish_scheduler.stop)
+atexit.register(view_counter.stop)
+atexit.register(password_hasher.shutdown)
+atexit.register(jobs.stop)
 
 # HTML template for the blog
 HTML_TEMPLATE = '''
@@ -68,6 +366,8 @@ HTML_TEMPLATE = '''
 <head>
     <title>Flask Blog</title>
     <meta charset="UTF-8">
+    <link rel="alternate" type="application/atom+xml" title="Flask Blog" href="/feed.atom">
+    <link rel="alternate" type="application/rss+xml" title="Flask Blog" href="/feed.rss">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <style>
         * { margin: 0; padding: 0; box-sizing: border-box; }
@@ -234,27 +534,18 @@ HTML_TEMPLATE = '''
 
         <div class="main-content">
             <div class="posts-section">
-                {% if posts %}
-                    {% for post in posts %}
-                    <article class="post-card">
-                        <h2><a href="/post/{{ post.id }}" class="post-title">{{ post.title }}</a></h2>
-                        <div class="post-meta">
-                            By {{ post.author_name }} • {{ post.created_at }} • {{ post.views }} views
-                        </div>
-                        <div class="post-excerpt">
-                            {{ post.content[:200] }}{% if post.content|length > 200 %}...{% endif %}
-                        </div>
-                        <div class="post-tags">
-                            {% for tag in post.tags %}
-                            <span class="tag">#{{ tag }}</span>
-                            {% endfor %}
-                        </div>
-                        <div class="post-stats">
-                            <span>❤️ {{ post.likes }} likes</span>
-                            <span>💬 {{ post.comments|length }} comments</span>
-                        </div>
-                    </article>
+                <div class="sort-links">
+                    Sort by:
+                    {% if sort == 'trending' %}<a href="/?limit={{ limit }}">Newest</a> • <strong>Trending</strong>
+                    {% else %}<strong>Newest</strong> • <a href="/?sort=trending&limit={{ limit }}">Trending</a>{% endif %}
+                </div>
+                {% if cards %}
+                    {% for card in cards %}
+                    {{ card }}
                     {% endfor %}
+                    {% if next_cursor %}
+                        <a href="/?cursor={{ next_cursor }}&limit={{ limit }}" class="btn">Older posts →</a>
+                    {% endif %}
                 {% else %}
                     <div class="post-card">
                         <h2>No posts yet</h2>
@@ -283,23 +574,15 @@ HTML_TEMPLATE = '''
 
                 <div class="sidebar-card">
                     <h3>📊 Blog Stats</h3>
-                    <p>Total Posts: {{ posts|length }}</p>
-                    <p>Total Users: {{ users|length }}</p>
-                    <p>Total Comments: {{ posts|sum(attribute='comments|length') }}</p>
+                    <p>Total Posts: {{ stats.post_count }}</p>
+                    <p>Total Users: {{ stats.user_count }}</p>
+                    <p>Total Comments: {{ stats.comment_count }}</p>
                 </div>
 
                 <div class="sidebar-card">
                     <h3>🏷️ Popular Tags</h3>
-                    {% set all_tags = [] %}
-                    {% for post in posts %}
-                        {% for tag in post.tags %}
-                            {% if tag not in all_tags %}
-                                {% set _ = all_tags.append(tag) %}
-                            {% endif %}
-                        {% endfor %}
-                    {% endfor %}
-                    {% for tag in all_tags[:10] %}
-                        <span class="tag">{{ tag }}</span>
+                    {% for tag, count in top_tags %}
+                        <span class="tag" title="{{ count }} posts">{{ tag }}</span>
                     {% endfor %}
                 </div>
             </div>
@@ -309,91 +592,420 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
-@app.route('/')
-def index():
-    """Home page showing all posts"""
-    return render_template_string(HTML_TEMPLATE, posts=posts, users=users)
-
-@app.route('/post/<post_id>')
-def view_post(post_id):
-    """View a specific post with comments"""
-    post = next((p for p in posts if p['id'] == post_id), None)
-    if not post:
-        flash('Post not found!', 'error')
-        return redirect('/')
-    
-    # Increment view count
-    post['views'] += 1
-    
-    return f'''
-    <div class="header">
-        <div class="header-content">
-            <h1>📝 Flask Blog</h1>
-            <nav class="nav-links">
-                <a href="/">🏠 Home</a>
-                <a href="/posts">📄 Posts</a>
-                <a href="/post/{post_id}">📄 Current Post</a>
-            </nav>
-        </div>
+# Template for one post card on the home page; rendered cards are cached per post
+POST_CARD_TEMPLATE = '''
+<article class="post-card">
+    <h2><a href="/post/{{ post.id }}" class="post-title">{{ post.title }}</a></h2>
+    <div class="post-meta">
+        By {{ post.author_name }} • {{ post.created_at }} • {{ post.views }} views
+    </div>
+    <div class="post-excerpt">
+        {{ post.content[:200] }}{% if post.content|length > 200 %}...{% endif %}
     </div>
+    <div class="post-tags">
+        {% for tag in post.tags %}
+        <span class="tag">#{{ tag }}</span>
+        {% endfor %}
+    </div>
+    <div class="post-stats">
+        <span>❤️ {{ post.likes }} likes</span>
+        <span>💬 {{ post.comment_count }} comments</span>
+    </div>
+</article>
+'''
 
-    <div class="container">
-        <div class="main-content">
-            <div class="posts-section">
-                <article class="post-card">
-                    <h1 class="post-title">{post['title']}</h1>
-                    <div class="post-meta">
-                        By {post['author_name']} • {post['created_at']} • {post['views']} views
-                    </div>
-                    <div class="post-tags">
-                        {% for tag in post['tags'] %}
-                        <span class="tag">#{tag}</span>
-                        {% endfor %}
-                    </div>
-                    <div class="post-excerpt" style="font-size: 16px; line-height: 1.8;">
-                        {post['content']}
-                    </div>
-                    <div class="post-stats">
-                        <span>❤️ {post['likes']} likes</span>
-                        <span>💬 {len(post['comments'])} comments</span>
-                    </div>
-                </article>
+# Template for a single post page with its comments
+POST_TEMPLATE = '''
+<div class="header">
+    <div class="header-content">
+        <h1>📝 Flask Blog</h1>
+        <nav class="nav-links">
+            <a href="/">🏠 Home</a>
+            <a href="/posts">📄 Posts</a>
+            <a href="/post/{{ post.id }}">📄 Current Post</a>
+        </nav>
+    </div>
+</div>
 
-                <div class="post-card">
-                    <h3>💬 Comments ({len(post['comments'])})</h3>
-                    {% if post['comments'] %}
-                        {% for comment in post['comments'] %}
-                        <div class="comment">
-                            <div class="comment-meta">
-                                By {comment['author']} • {comment['created_at']}
-                            </div>
-                            <div>{comment['content']}</div>
-                        </div>
-                        {% endfor %}
+<div class="container">
+    <div class="main-content">
+        <div class="posts-section">
+            {% if post.status != 'published' %}
+            <div class="post-card">
+                <p>
+                    <strong>{% if post.status == 'scheduled' %}Scheduled for {{ post.publish_at }}{% else %}Draft{% endif %}</strong>
+                    • only you can see this post.
+                </p>
+                <form method="POST" action="/post/{{ post.id }}/publish">
+                    <button type="submit" class="btn">Publish now</button>
+                </form>
+            </div>
+            {% endif %}
+            <article class="post-card">
+                <h1 class="post-title">{{ post.title }}</h1>
+                <div class="post-meta">
+                    By {{ post.author_name }} • {{ post.created_at }} • {{ views }} views • {{ unique_viewers }} unique viewers
+                </div>
+                <div class="post-tags">
+                    {% for tag in post.tags %}
+                    <span class="tag">#{{ tag }}</span>
+                    {% endfor %}
+                </div>
+                <div class="post-excerpt" style="font-size: 16px; line-height: 1.8;">
+                    {{ post.content }}
+                </div>
+                {% for attachment in post.attachments or () %}
+                    {% if attachment.content_type.startswith('image/') %}
+                    <img src="/post/{{ post.id }}/attachments/{{ attachment.id }}" alt="{{ attachment.name }}" style="max-width: 100%; margin-bottom: 15px;">
                     {% else %}
-                        <p>No comments yet. Be the first to comment!</p>
+                    <p>📎 <a href="/post/{{ post.id }}/attachments/{{ attachment.id }}">{{ attachment.name }}</a> ({{ attachment.size }} bytes)</p>
                     {% endif %}
-
+                {% endfor %}
+                {% if session.get('user_id') == post.author_id or session.get('role') == 'admin' %}
+                <div class="form-group">
+                    <label for="attachment-file">Attach a file:</label>
+                    <input type="file" id="attachment-file">
+                </div>
+                {% endif %}
+                <div class="post-stats">
+                    <span>❤️ <span id="like-count">{{ post.likes }}</span> likes</span>
                     {% if session.get('user_id') %}
-                    <form method="POST" action="/post/{post_id}/comment" style="margin-top: 20px;">
-                        <div class="form-group">
-                            <label for="comment">Add a comment:</label>
-                            <textarea name="comment" rows="3" required></textarea>
-                        </div>
-                        <button type="submit" class="btn">Post Comment</button>
-                    </form>
-                    {% else %}
-                    <p><a href="/login">Login</a> to add a comment.</p>
+                    <button id="like-button" class="btn" data-liked="{{ 'true' if liked else 'false' }}">{{ 'Unlike' if liked else 'Like' }}</button>
                     {% endif %}
+                    <span>💬 {{ post.comment_count }} comments</span>
+                </div>
+            </article>
+
+            <div class="post-card">
+                <h3>💬 Comments (<span id="comment-count">{{ post.comment_count }}</span>)</h3>
+                {% if not comments %}
+                    <p id="no-comments">No comments yet. Be the first to comment!</p>
+                {% endif %}
+                <div id="comments">
+                    {% for comment in comments %}
+                    <div class="comment">
+                        <div class="comment-meta">
+                            By {{ comment.author }} • {{ comment.created_at }}
+                        </div>
+                        <div>{{ comment.content }}</div>
+                    </div>
+                    {% endfor %}
                 </div>
+                {% if next_cursor %}
+                <button id="more-comments" class="btn" data-cursor="{{ next_cursor }}">Load more comments</button>
+                {% endif %}
+
+                {% if session.get('user_id') %}
+                <form method="POST" action="/post/{{ post.id }}/comment" style="margin-top: 20px;">
+                    <div class="form-group">
+                        <label for="comment">Add a comment:</label>
+                        <textarea name="comment" rows="3" required></textarea>
+                    </div>
+                    <button type="submit" class="btn">Post Comment</button>
+                </form>
+                {% else %}
+                <p><a href="/login">Login</a> to add a comment.</p>
+                {% endif %}
+            </div>
+        </div>
+
+        <div class="sidebar">
+            <div class="sidebar-card">
+                <h3>🔗 Related Posts</h3>
+                {% for related_post, score in related %}
+                    <p><a href="/post/{{ related_post.id }}">{{ related_post.title }}</a></p>
+                {% else %}
+                    <p>No related posts yet.</p>
+                {% endfor %}
             </div>
         </div>
     </div>
-    '''
+</div>
+
+<script>
+const commentList = document.getElementById('comments');
+const moreButton = document.getElementById('more-comments');
+
+function appendComment(comment) {
+    const item = document.createElement('div');
+    item.className = 'comment';
+    const meta = document.createElement('div');
+    meta.className = 'comment-meta';
+    meta.textContent = `By ${comment.author} • ${comment.created_at}`;
+    const body = document.createElement('div');
+    body.textContent = comment.content;
+    item.append(meta, body);
+    commentList.append(item);
+}
+
+// Like and unlike without reloading the page
+const likeButton = document.getElementById('like-button');
+if (likeButton) {
+    likeButton.addEventListener('click', async () => {
+        const liked = likeButton.dataset.liked === 'true';
+        const response = await fetch('/api/posts/{{ post.id }}/like', {method: liked ? 'DELETE' : 'POST'});
+        if (!response.ok) {
+            return;
+        }
+        const data = await response.json();
+        document.getElementById('like-count').textContent = data.likes;
+        likeButton.dataset.liked = String(data.liked);
+        likeButton.textContent = data.liked ? 'Unlike' : 'Like';
+    });
+}
+
+// Attachments are sent as the raw request body, so the server can stream
+// them to disk instead of parsing a multipart form
+const attachmentInput = document.getElementById('attachment-file');
+if (attachmentInput) {
+    attachmentInput.addEventListener('change', async () => {
+        const file = attachmentInput.files[0];
+        if (!file) {
+            return;
+        }
+        const response = await fetch('/api/posts/{{ post.id }}/attachments', {
+            method: 'POST',
+            headers: {'Content-Type': file.type || 'application/octet-stream', 'X-Filename': encodeURIComponent(file.name)},
+            body: file
+        });
+        if (response.ok) {
+            location.reload();
+        } else {
+            alert((await response.json()).error);
+        }
+    });
+}
+
+// Fetch further pages of comments only when the reader asks for them
+if (moreButton) {
+    moreButton.addEventListener('click', async () => {
+        const url = '/api/posts/{{ post.id }}/comments?limit={{ comment_page_size }}&cursor='
+            + encodeURIComponent(moreButton.dataset.cursor);
+        const data = await (await fetch(url)).json();
+        data.comments.forEach(appendComment);
+        if (data.next_cursor) {
+            moreButton.dataset.cursor = data.next_cursor;
+        } else {
+            moreButton.remove();
+        }
+    });
+}
+
+// New comments arrive over Server-Sent Events instead of a page reload
+const stream = new EventSource('/api/posts/{{ post.id }}/events');
+stream.addEventListener('comment', (message) => {
+    const count = document.getElementById('comment-count');
+    count.textContent = Number(count.textContent) + 1;
+    const empty = document.getElementById('no-comments');
+    if (empty) {
+        empty.remove();
+    }
+    // Comments are oldest first; with unloaded pages the new one is not next
+    if (!document.getElementById('more-comments')) {
+        appendComment(JSON.parse(message.data));
+    }
+});
+stream.addEventListener('resync', () => window.location.reload());
+</script>
+'''
+
+# Author dashboard; numbers come from the per-author running totals
+PROFILE_TEMPLATE = '''
+<div class="header">
+    <div class="header-content">
+        <h1>📝 Flask Blog</h1>
+        <nav class="nav-links">
+            <a href="/">🏠 Home</a>
+            <a href="/posts">📄 Posts</a>
+            <a href="/new-post">✏️ New Post</a>
+        </nav>
+    </div>
+</div>
+
+<div class="container">
+    <div class="main-content">
+        <div class="posts-section">
+            <div class="post-card">
+                <h2>👤 {{ user.username }}</h2>
+                <p>{{ user.email }} • {{ user.role }} • member since {{ user.created_at }}</p>
+            </div>
+
+            <div class="post-card">
+                <h3>📊 Your Stats</h3>
+                <p>Posts: {{ totals.posts }}
+                   ({{ totals.statuses.published }} published, {{ totals.statuses.scheduled }} scheduled,
+                   {{ totals.statuses.draft }} drafts)</p>
+                <p>Views: {{ totals.views }}</p>
+                <p>Likes: {{ totals.likes }}</p>
+                <p>Comments: {{ totals.comments }}</p>
+            </div>
+
+            <div class="post-card">
+                <h3>🔥 Top Posts</h3>
+                {% for post in top_posts %}
+                    <p>
+                        <a href="/post/{{ post.id }}">{{ post.title }}</a>
+                        • {{ post.views }} views • {{ post.likes }} likes • {{ post.comment_count }} comments
+                        {% if post.status != 'published' %}• {{ post.status }}{% endif %}
+                    </p>
+                {% else %}
+                    <p>No posts yet. <a href="/new-post">Write your first one!</a></p>
+                {% endfor %}
+            </div>
+        </div>
+    </div>
+</div>
+'''
+
+# Templates are compiled once at startup and reused for every request
+index_template = app.jinja_env.from_string(HTML_TEMPLATE)
+post_card_template = app.jinja_env.from_string(POST_CARD_TEMPLATE)
+post_template = app.jinja_env.from_string(POST_TEMPLATE)
+profile_template = app.jinja_env.from_string(PROFILE_TEMPLATE)
+
+# Rendered post cards, keyed by post id and versioned by what the card shows
+card_cache = FragmentCache()
+
+def is_anonymous_view():
+    """True when the page looks the same as for every logged-out visitor"""
+    return not session.get('user_id') and '_flashes' not in session
+
+def cached_page_response(page, hit):
+    """Serve a cached page, gzipped when the client accepts it"""
+    if 'gzip' in request.accept_encodings:
+        response = Response(page.gzipped, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(page.body, mimetype='text/html')
+    response.vary.update(('Accept-Encoding', 'Cookie'))
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+def render_post_card(post):
+    """Return the HTML card for a post, re-rendering only when it changed"""
+    version = (post['updated_at'], post['views'], post['likes'], post['comment_count'])
+    html = card_cache.get_or_render(post['id'], version, lambda: post_card_template.render(post=posts.with_content(post)))
+    return Markup(html)
+
+def get_page_args():
+    """Read ?limit= and ?cursor= from the query string"""
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor') or None
+    return limit, cursor
+
+def conditional_response(key, variant, build):
+    """Answer 304 from the version counters, otherwise build and tag the response
+
+    The validators are read before build() runs, so a write racing with the
+    request can only make the ETag older than the body, never newer.
+    """
+    etag, last_modified = versions.validators(key, variant)
+    if not_modified(request, etag, last_modified):
+        return set_validators(app.response_class(status=304), etag, last_modified)
+    response = app.make_response(build(last_modified))
+    if response.status_code == 200:
+        set_validators(response, etag, last_modified)
+    return response
+
+def get_trending(limit):
+    """The limit highest trending posts, best first"""
+    found = [posts.get(post_id) for post_id, _ in trending.top(limit)]
+    return [post for post in found if post is not None]
+
+@app.route('/')
+def index():
+    """Home page showing the newest posts, one page at a time"""
+    limit, cursor = get_page_args()
+    sort = 'trending' if request.args.get('sort') == 'trending' else 'newest'
+    # Logged-out visitors without pending messages all get the same page;
+    # the trending order moves with every view, so only newest is cached
+    anonymous = is_anonymous_view() and sort == 'newest'
+    if anonymous:
+        cache_key = (limit, cursor)
+        cached = page_cache.get(cache_key)
+        if cached is not None:
+            return cached_page_response(cached, hit=True)
+        generation = page_cache.generation
+
+    if sort == 'trending':
+        page, next_cursor = get_trending(limit), None
+    else:
+        try:
+            page, next_cursor = posts.page(limit, cursor, status='published')
+        except ValueError:
+            flash('Invalid page cursor!', 'error')
+            return redirect('/')
+    cards = [render_post_card(post) for post in page]
+    html = render_template(index_template, cards=cards, stats=site_stats, top_tags=site_stats.top_tags(10),
+                           next_cursor=next_cursor, limit=limit, sort=sort)
+    if not anonymous:
+        return html
+
+    tags = ['stats'] + [('post', post['id']) for post in page]
+    cached = page_cache.put(cache_key, html.encode(), tags, generation)
+    return cached_page_response(cached, hit=False)
+
+def get_related(post_id):
+    """[(post, score)] from the precomputed related posts list"""
+    found = []
+    for related_id, score in related_posts.related(post_id):
+        related_post = posts.get(related_id)
+        if related_post is not None:
+            found.append((related_post, score))
+    return found
+
+def can_view(post):
+    """Published posts are public; drafts and scheduled ones only for their author and admins"""
+    if post['status'] == 'published':
+        return True
+    return session.get('role') == 'admin' or session.get('user_id') == post['author_id']
+
+def get_visible_post(post_id):
+    """The post if the current visitor may see it, otherwise None"""
+    post = posts.get(post_id)
+    return post if post is not None and can_view(post) else None
+
+def count_unique_view(post_id):
+    """Add this visitor to the post's unique viewer sketch"""
+    user_id = session.get('user_id')
+    visitor = f'user:{user_id}' if user_id else f'ip:{request.remote_addr}'
+    change = unique_viewers.add(post_id, visitor)
+    if change is not None:
+        # Not synced: a lost register update only makes the estimate lower
+        event_log.append({'op': 'viewer_seen', 'post_id': post_id, 'register': change[0], 'rank': change[1]})
+
+def is_liked(post_id):
+    """True if the logged-in user likes the post"""
+    member = users.number(session.get('user_id'))
+    return member is not None and posts.liked(post_id, member)
+
+@app.route('/post/<post_id>')
+def view_post(post_id):
+    """View a specific post with comments"""
+    post = get_visible_post(post_id)
+    if not post:
+        flash('Post not found!', 'error')
+        return redirect('/')
+    
+    # Count the view; the post record is updated by the next flush
+    view_counter.hit(post_id)
+    views = post['views'] + view_counter.pending(post_id)
+    count_unique_view(post_id)
+    
+    comments, next_cursor = posts.comments_page(post_id, COMMENT_PAGE_SIZE)
+    return render_template(post_template, post=posts.with_content(post), views=views, comments=comments,
+                           next_cursor=next_cursor, comment_page_size=COMMENT_PAGE_SIZE,
+                           related=get_related(post_id), liked=is_liked(post_id),
+                           unique_viewers=unique_viewers.estimate(post_id))
 
 @app.route('/post/<post_id>/comment', methods=['POST'])
 def add_comment(post_id):
     """Add a comment to a post"""
+    limited = rate_limited('comment')
+    if limited:
+        return limited
+    
     if not session.get('user_id'):
         flash('Please login to comment!', 'error')
         return redirect(f'/post/{post_id}')
@@ -403,7 +1015,7 @@ def add_comment(post_id):
         flash('Comment cannot be empty!', 'error')
         return redirect(f'/post/{post_id}')
     
-    post = next((p for p in posts if p['id'] == post_id), None)
+    post = get_visible_post(post_id)
     if not post:
         flash('Post not found!', 'error')
         return redirect('/')
@@ -416,10 +1028,46 @@ def add_comment(post_id):
         'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
     
-    post['comments'].append(comment)
+    posts.add_comment(post_id, comment)
+    event_log.sync()
     flash('Comment added successfully!', 'success')
     return redirect(f'/post/{post_id}')
 
+@app.route('/post/<post_id>/publish', methods=['POST'])
+def publish_post(post_id):
+    """Publish a draft or scheduled post right away"""
+    post = posts.get(post_id)
+    if not post or session.get('role') != 'admin' and session.get('user_id') != post['author_id']:
+        flash('Post not found!', 'error')
+        return redirect('/')
+    
+    if post['status'] != 'published':
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        posts.update(post_id, status='published', publish_at=None, created_at=now, updated_at=now)
+        event_log.sync()
+        flash('Post published!', 'success')
+    return redirect(f'/post/{post_id}')
+
+@app.route('/post/<post_id>/attachments/<digest>')
+def post_attachment(post_id, digest):
+    """Serve a post's attachment, with Range support and long-lived caching"""
+    post = get_visible_post(post_id)
+    attachment = next((a for a in (post or {}).get('attachments') or () if a['id'] == digest), None)
+    if attachment is None:
+        return jsonify({"error": "Attachment not found"}), 404
+    
+    # The URL names the content, which never changes, so it can be cached for good
+    response = send_file(attachments.path(digest), mimetype=attachment['content_type'],
+                         as_attachment=not attachment['content_type'].startswith('image/'),
+                         download_name=attachment['name'], conditional=True, etag=digest,
+                         max_age=ATTACHMENT_MAX_AGE)
+    response.cache_control.immutable = True
+    if post['status'] != 'published':
+        response.cache_control.public = False
+        response.cache_control.private = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
 @app.route('/new-post', methods=['GET', 'POST'])
 def new_post():
     """Create a new post"""
@@ -439,6 +1087,22 @@ def new_post():
         # Parse tags
         tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
         
+        status = request.form.get('status', 'published')
+        if status not in POST_STATUSES:
+            flash('Invalid post status!', 'error')
+            return redirect('/new-post')
+        publish_at = None
+        if status == 'scheduled':
+            # <input type="datetime-local"> sends e.g. 2024-01-15T10:00
+            try:
+                when = datetime.fromisoformat(request.form.get('publish_at', '').strip())
+            except ValueError:
+                when = None
+            if when is None or when <= datetime.now():
+                flash('Scheduled posts need a publish time in the future!', 'error')
+                return redirect('/new-post')
+            publish_at = when.strftime('%Y-%m-%d %H:%M:%S')
+        
         post = {
             'id': str(uuid.uuid4()),
             'title': title,
@@ -446,16 +1110,23 @@ def new_post():
             'author_id': session.get('user_id'),
             'author_name': session.get('username'),
             'tags': tag_list,
-            'status': 'published',
+            'status': status,
+            'publish_at': publish_at,
             'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'views': 0,
             'likes': 0,
-            'comments': []
+            'comment_count': 0
         }
         
-        posts.append(post)
-        flash('Post created successfully!', 'success')
+        posts.add(post)
+        event_log.sync()
+        if status == 'draft':
+            flash('Draft saved!', 'success')
+        elif status == 'scheduled':
+            flash(f'Post scheduled for {publish_at}!', 'success')
+        else:
+            flash('Post created successfully!', 'success')
         return redirect(f'/post/{post["id"]}')
     
     return '''
@@ -488,6 +1159,18 @@ def new_post():
                             <label for="tags">Tags (comma-separated):</label>
                             <input type="text" id="tags" name="tags" placeholder="python, flask, web-development">
                         </div>
+                        <div class="form-group">
+                            <label for="status">Publish:</label>
+                            <select id="status" name="status">
+                                <option value="published">Now</option>
+                                <option value="scheduled">At a set time</option>
+                                <option value="draft">Save as draft</option>
+                            </select>
+                        </div>
+                        <div class="form-group">
+                            <label for="publish_at">Publish at (scheduled posts):</label>
+                            <input type="datetime-local" id="publish_at" name="publish_at">
+                        </div>
                         <button type="submit" class="btn">Create Post</button>
                         <a href="/" class="btn">Cancel</a>
                     </form>
@@ -497,10 +1180,31 @@ def new_post():
     </div>
     '''
 
+def busy_response():
+    """503 for when the password hashing pool is saturated"""
+    return 'Server is busy, please try again in a moment.', 503, {'Retry-After': '1'}
+
+@app.errorhandler(EventLogFailed)
+def log_failed_response(error):
+    """503 for writes that could not be made durable (the disk is full or failing)"""
+    app.logger.error('%s', error)
+    return 'Changes cannot be saved right now, please try again later.', 503
+
+def rate_limited(route):
+    """429 if this client is over the route's limit, otherwise None"""
+    retry_after = RATE_LIMITS[route].check(request.remote_addr, session.get('user_id'))
+    if not retry_after:
+        return None
+    return f'Too many requests, please try again in {retry_after} seconds.', 429, {'Retry-After': str(retry_after)}
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """User login"""
     if request.method == 'POST':
+        limited = rate_limited('login')
+        if limited:
+            return limited
+        
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         
@@ -508,8 +1212,18 @@ def login():
             flash('Username and password are required!', 'error')
             return redirect('/login')
         
-        user = next((u for u in users if u['username'] == username), None)
-        if user and user['password_hash'] == hashlib.sha256(password.encode()).hexdigest():
+        user = users.by_username(username)
+        try:
+            matches, new_hash = password_hasher.verify(
+                password, user['password_hash'] if user else DUMMY_PASSWORD_HASH)
+        except HasherBusy:
+            return busy_response()
+
+        if user and matches:
+            if new_hash:
+                # Transparently upgrade legacy SHA-256 hashes to scrypt
+                users.set_password_hash(user['id'], new_hash)
+                event_log.append({'op': 'password_changed', 'user_id': user['id'], 'password_hash': new_hash})
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
@@ -562,6 +1276,10 @@ def login():
 def register():
     """User registration"""
     if request.method == 'POST':
+        limited = rate_limited('register')
+        if limited:
+            return limited
+        
         username = request.form.get('username', '').strip()
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '').strip()
@@ -570,21 +1288,35 @@ def register():
             flash('All fields are required!', 'error')
             return redirect('/register')
         
-        # Check if username already exists
-        if any(u['username'] == username for u in users):
+        # Cheap checks first so a taken name does not cost a password hash
+        if users.by_username(username):
             flash('Username already exists!', 'error')
             return redirect('/register')
+        if users.by_email(email):
+            flash('Email already registered!', 'error')
+            return redirect('/register')
+        
+        try:
+            password_hash = password_hasher.hash(password)
+        except HasherBusy:
+            return busy_response()
         
         new_user = {
             'id': str(uuid.uuid4()),
             'username': username,
             'email': email,
-            'password_hash': hashlib.sha256(password.encode()).hexdigest(),
+            'password_hash': password_hash,
             'role': 'user',
             'created_at': datetime.now().strftime('%Y-%m-%d')
         }
         
-        users.append(new_user)
+        # The checks above can race with another registration; add() decides
+        try:
+            sequence = add_user(new_user)
+        except DuplicateUser as e:
+            flash('Email already registered!' if e.field == 'email' else 'Username already exists!', 'error')
+            return redirect('/register')
+        event_log.sync(sequence)
         flash('Registration successful! Please login.', 'success')
         return redirect('/login')
     
@@ -626,6 +1358,23 @@ def register():
     </div>
     '''
 
+def author_dashboard(user):
+    """(totals, top posts) for a user's dashboard, from the running totals"""
+    totals, top_ids = author_stats.get(user['id'])
+    top_posts = [post for post in map(posts.get, top_ids) if post is not None]
+    return totals, top_posts
+
+@app.route('/profile')
+def profile():
+    """Dashboard with the logged-in author's stats and top posts"""
+    user = users.get(session.get('user_id'))
+    if not user:
+        flash('Please login to see your profile!', 'error')
+        return redirect('/login')
+    
+    totals, top_posts = author_dashboard(user)
+    return render_template(profile_template, user=user, totals=totals, top_posts=top_posts)
+
 @app.route('/logout')
 def logout():
     """User logout"""
@@ -635,30 +1384,328 @@ def logout():
 
 @app.route('/api/posts')
 def api_posts():
-    """API endpoint to get all posts"""
-    return jsonify({
-        "posts": posts,
-        "total": len(posts),
-        "timestamp": datetime.now().isoformat()
-    })
+    """API endpoint to get posts, newest first, with cursor pagination"""
+    limit, cursor = get_page_args()
+    ndjson = wants_ndjson(request)
+
+    def build(last_modified):
+        try:
+            page, next_cursor = posts.page(limit, cursor, status='published')
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        if ndjson:
+            response = stream_records(map(posts.with_content, page), ndjson=True)
+            response.headers['X-Total-Count'] = str(posts.count('published'))
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            return response
+        return stream_records(map(posts.with_content, page), key="posts", head={
+            "total": posts.count('published'),
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "timestamp": last_modified.isoformat()
+        })
+
+    variant = f'{limit}:{cursor}:{ndjson}'
+    return conditional_response('posts', variant, build)
+
+@app.route('/api/posts/trending')
+def api_posts_trending():
+    """API endpoint listing posts by time-decayed activity score"""
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    results = []
+    for post_id, score in trending.top(limit):
+        post = posts.get(post_id)
+        if post is not None:
+            results.append({
+                "id": post['id'],
+                "title": post['title'],
+                "author_name": post['author_name'],
+                "tags": post['tags'],
+                "created_at": post['created_at'],
+                "views": post['views'],
+                "likes": post['likes'],
+                "comment_count": post['comment_count'],
+                "score": round(score, 4)
+            })
+    return jsonify({"posts": results, "limit": limit, "half_life_hours": trending.half_life / 3600})
+
+@app.route('/api/posts/export')
+def api_posts_export():
+    """API endpoint streaming every post with its comments as NDJSON"""
+    if session.get('role') != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+    response = stream_records(export_posts(posts), ndjson=True)
+    response.headers['Content-Disposition'] = 'attachment; filename=posts.ndjson'
+    return response
+
+@app.route('/api/posts/import', methods=['POST'])
+def api_posts_import():
+    """API endpoint loading posts from an NDJSON body, one post per line"""
+    if session.get('role') != 'admin':
+        return jsonify({"error": "Admin access required"}), 403
+    # The body is read in chunks and inserted a batch at a time, each batch
+    # durable before the next is read.  No bulk_load() here: pausing and
+    # freezing the GC is process-wide and would catch other requests too
+    summary = import_posts(read_lines(request.stream), posts, after_batch=event_log.sync)
+    return jsonify(summary), 200 if summary['imported'] or not summary['failed'] else 400
 
 @app.route('/api/posts/<post_id>')
 def api_post(post_id):
     """API endpoint to get a specific post"""
-    post = next((p for p in posts if p['id'] == post_id), None)
-    if post:
-        return jsonify(post)
-    return jsonify({"error": "Post not found"}), 404
+    post = get_visible_post(post_id)
+    if not post:
+        return jsonify({"error": "Post not found"}), 404
+    def build(last_modified):
+        return jsonify(dict(posts.with_content(post), liked=is_liked(post_id), unique_viewers=unique_viewers.estimate(post_id)))
+
+    # liked differs per user; unique_viewers moves together with views
+    return conditional_response(('post', post_id), session.get('user_id') or '', build)
+
+@app.route('/api/posts/<post_id>/like', methods=['POST', 'DELETE'])
+def api_post_like(post_id):
+    """API endpoint to like (POST) or unlike (DELETE) a post, once per user"""
+    user_id = session.get('user_id')
+    member = users.number(user_id)
+    if member is None:
+        return jsonify({"error": "Login required"}), 401
+    if get_visible_post(post_id) is None:
+        return jsonify({"error": "Post not found"}), 404
+    post, changed = posts.set_liked(post_id, user_id, member, liked=request.method == 'POST')
+    if post is None:
+        return jsonify({"error": "Post not found"}), 404
+    if changed:
+        event_log.sync()
+    return jsonify({"post_id": post_id, "liked": request.method == 'POST', "likes": post['likes']})
+
+@app.route('/api/posts/<post_id>/attachments', methods=['POST'])
+def api_post_attachments(post_id):
+    """API endpoint attaching the raw request body to a post as a file"""
+    post = posts.get(post_id)
+    if not post:
+        return jsonify({"error": "Post not found"}), 404
+    if session.get('user_id') != post['author_id'] and session.get('role') != 'admin':
+        return jsonify({"error": "Only the author can add attachments"}), 403
+    content_type = request.mimetype
+    if content_type not in ATTACHMENT_TYPES:
+        return jsonify({"error": f"Unsupported attachment type: {content_type or 'none'}"}), 415
+    if request.content_length is not None and request.content_length > attachments.max_bytes:
+        return jsonify({"error": f"Attachments are limited to {attachments.max_bytes} bytes"}), 413
+    name = os.path.basename(unquote(request.headers.get('X-Filename', ''))).strip()[:255] or 'attachment'
+    
+    # request.stream is the unparsed body: it is copied to disk a chunk at
+    # a time and never buffered whole
+    try:
+        digest, size, created = attachments.save(request.stream)
+    except AttachmentTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    
+    attachment = {'id': digest, 'name': name, 'content_type': content_type, 'size': size}
+    with posts.lock:
+        post = posts.get(post_id)
+        current = post.get('attachments') or []
+        if not any(existing['id'] == digest for existing in current):
+            posts.update(post_id, attachments=current + [attachment])
+    event_log.sync()
+    return jsonify({
+        "attachment": attachment,
+        "url": f'/post/{post_id}/attachments/{digest}',
+        "deduplicated": not created
+    }), 201
+
+@app.route('/api/posts/<post_id>/comments')
+def api_post_comments(post_id):
+    """API endpoint to page through a post's comments, oldest first"""
+    if get_visible_post(post_id) is None:
+        return jsonify({"error": "Post not found"}), 404
+    limit = min(max(request.args.get('limit', COMMENT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor') or None
+
+    def build(last_modified):
+        try:
+            comments, next_cursor = posts.comments_page(post_id, limit, cursor)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        return jsonify({
+            "comments": comments,
+            "total": posts.get(post_id)['comment_count'],
+            "limit": limit,
+            "next_cursor": next_cursor
+        })
+
+    return conditional_response(('post', post_id), f'comments:{limit}:{cursor}', build)
+
+def event_stream_response(*topics):
+    """text/event-stream response for a new subscriber to the topics"""
+    subscriber = broadcaster.subscribe(*topics)
+    response = Response(broadcaster.stream(subscriber), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/posts/<post_id>/related')
+def api_post_related(post_id):
+    """API endpoint listing the posts that share the most tags with a post"""
+    if get_visible_post(post_id) is None:
+        return jsonify({"error": "Post not found"}), 404
+    return jsonify({
+        "post_id": post_id,
+        "related": [
+            {
+                "id": related_post['id'],
+                "title": related_post['title'],
+                "author_name": related_post['author_name'],
+                "tags": related_post['tags'],
+                "created_at": related_post['created_at'],
+                "score": round(score, 4)
+            }
+            for related_post, score in get_related(post_id)
+        ]
+    })
+
+@app.route('/api/authors/<username>/stats')
+def api_author_stats(username):
+    """API endpoint with an author's dashboard numbers (the author or an admin only)"""
+    user = users.by_username(username)
+    if user is None:
+        return jsonify({"error": "Author not found"}), 404
+    if session.get('user_id') != user['id'] and session.get('role') != 'admin':
+        return jsonify({"error": "Not allowed"}), 403
+    totals, top_posts = author_dashboard(user)
+    return jsonify(dict(totals, author={"id": user['id'], "username": user['username']}, top_posts=[
+        {
+            "id": post['id'],
+            "title": post['title'],
+            "status": post['status'],
+            "views": post['views'],
+            "likes": post['likes'],
+            "comment_count": post['comment_count']
+        }
+        for post in top_posts
+    ]))
+
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events stream of every new post and comment"""
+    return event_stream_response('posts', 'comments')
+
+@app.route('/api/posts/<post_id>/events')
+def api_post_events(post_id):
+    """Server-Sent Events stream of new comments on one post"""
+    if get_visible_post(post_id) is None:
+        return jsonify({"error": "Post not found"}), 404
+    return event_stream_response(('post', post_id))
+
+@app.route('/api/search')
+def api_search():
+    """API endpoint for ranked full-text search over posts"""
+    query = request.args.get('q', '').strip()
+    tags = request.args.getlist('tag')
+    page = request.args.get('page', 1, type=int)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+
+    if not query and not tags:
+        return jsonify({"error": "Query parameter 'q' or 'tag' is required"}), 400
+
+    found = search_index.search(query, tags=tags, page=page, per_page=per_page)
+    return jsonify({
+        "query": query,
+        "tags": tags,
+        "results": [
+            {
+                "id": post['id'],
+                "title": post['title'],
+                "author_name": post['author_name'],
+                "tags": post['tags'],
+                "created_at": post['created_at'],
+                "score": round(score, 4)
+            }
+            for post, score in found['results']
+        ],
+        "total": found['total'],
+        "page": max(page, 1),
+        "per_page": per_page
+    })
+
+def feed_posts(scope):
+    """The newest published posts for a feed scope, with their content"""
+    if scope[0] == 'all':
+        newest = posts.page(FEED_SIZE, status='published')[0]
+    elif scope[0] == 'tag':
+        newest = posts.page(FEED_SIZE, status='published', tag=scope[1])[0]
+    else:
+        newest = posts.page(FEED_SIZE, status='published', author_id=scope[1])[0]
+    return [posts.with_content(post) for post in newest]
+
+def feed_response(render, mimetype):
+    """Serve the feed for ?tag= or ?author= (default: all posts) from the feed cache"""
+    tag = request.args.get('tag', '').strip()
+    author = request.args.get('author', '').strip()
+    title, query = 'Flask Blog', {}
+    if author:
+        user = users.by_username(author)
+        if user is None:
+            return jsonify({"error": "Author not found"}), 404
+        scope = ('author', user['id'])
+        title += f": posts by {user['username']}"
+        query['author'] = user['username']
+    elif tag:
+        scope = ('tag', tag)
+        title += f': #{tag}'
+        query['tag'] = tag
+    else:
+        scope = ('all',)
+
+    site_url = request.host_url
+    feed_url = request.base_url + ('?' + urlencode(query) if query else '')
+    key = (mimetype, scope, site_url)
+    feed = feed_cache.get_or_render(key, lambda: render(title, site_url, feed_url, feed_posts(scope)))
+    if not_modified(request, feed.etag, feed.last_modified):
+        response = app.response_class(status=304)
+    else:
+        response = Response(feed.body, mimetype=mimetype)
+    set_validators(response, feed.etag, feed.last_modified)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@app.route('/feed.atom')
+def feed_atom():
+    """Atom feed of the newest posts, optionally for one tag or author"""
+    return feed_response(render_atom, 'application/atom+xml')
+
+@app.route('/feed.rss')
+def feed_rss():
+    """RSS feed of the newest posts, optionally for one tag or author"""
+    return feed_response(render_rss, 'application/rss+xml')
+
+@app.route('/api/cache-stats')
+def api_cache_stats():
+    """API endpoint reporting post card, page, feed and post body cache counters"""
+    return jsonify({"post_cards": card_cache.stats(), "pages": page_cache.stats(), "feeds": feed_cache.stats(),
+                    "post_bodies": post_bodies.stats()})
+
+@app.route('/api/jobs')
+def api_jobs():
+    """API endpoint reporting background job queue depth, latency and failures"""
+    return jsonify(jobs.stats())
+
+@app.route('/api/rate-limits')
+def api_rate_limits():
+    """API endpoint reporting allowed and limited requests per route"""
+    return jsonify({route: policy.stats() for route, policy in RATE_LIMITS.items()})
 
 @app.route('/api/users')
 def api_users():
-    """API endpoint to get all users (without passwords)"""
-    safe_users = []
-    for user in users:
-        safe_user = user.copy()
-        safe_user.pop('password_hash', None)
-        safe_users.append(safe_user)
-    return jsonify(safe_users)
+    """API endpoint to get all users (without passwords), streamed"""
+    ndjson = wants_ndjson(request)
+
+    def build(last_modified):
+        # Only the users present now; registrations during the stream are left out
+        current = itertools.islice(users, len(users))
+        return stream_records(current, exclude=('password_hash',), ndjson=ndjson)
+
+    return conditional_response('users', str(ndjson), build)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5002) 
\ No newline at end of file
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import re
+import tempfile
+
+# Bytes read from the request and written to disk at a time
+CHUNK_SIZE = 64 * 1024
+
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+
+class AttachmentTooLarge(Exception):
+    """The upload went past the size limit; nothing was stored"""
+
+
+class AttachmentStore:
+    """Uploaded files stored once under the SHA-256 of their content
+
+    save() copies a stream to a temporary file CHUNK_SIZE bytes at a time,
+    hashing as it goes, then renames it to attachments/<ab>/<digest>; if
+    that file already exists the copy is dropped, so identical uploads
+    share one file.  Memory use per upload is one chunk whatever the file
+    size.  Files are never changed once stored, which is what lets them be
+    served with long-lived cache headers.
+    """
+
+    def __init__(self, directory, max_bytes=20 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stored = 0
+        self.deduplicated = 0
+        self._tmp_dir = os.path.join(directory, 'tmp')
+
+    def start(self):
+        """Create the directories and remove uploads left unfinished by a crash"""
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        for name in os.listdir(self._tmp_dir):
+            os.remove(os.path.join(self._tmp_dir, name))
+
+    def path(self, digest):
+        """Where the file with this digest is (or would be) stored"""
+        if not DIGEST_RE.fullmatch(digest):
+            raise ValueError('Invalid attachment digest')
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def save(self, stream):
+        """Store everything read from the stream; returns (digest, size, created)
+
+        Raises AttachmentTooLarge once more than max_bytes have been read.
+        The file is fsynced before it is renamed into place, so a digest
+        handed out always names a complete file.
+        """
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AttachmentTooLarge(f'Attachments are limited to {self.max_bytes} bytes')
+                    sha.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            digest = sha.hexdigest()
+            path = self.path(digest)
+            if os.path.exists(path):
+                self.deduplicated += 1
+                return digest, size, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            tmp_path = None
+            # Make the rename itself durable before the digest is logged
+            dir_fd = os.open(os.path.dirname(path), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            self.stored += 1
+            return digest, size, True
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
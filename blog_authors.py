@@ -0,0 +1,100 @@
+import threading
+
+from blog_store import POST_STATUSES
+
+
+class AuthorTotals:
+    """Running totals for one author"""
+
+    __slots__ = ('posts', 'statuses', 'views', 'likes', 'comments', 'top')
+
+    def __init__(self):
+        self.posts = 0
+        self.statuses = dict.fromkeys(POST_STATUSES, 0)
+        self.views = 0
+        self.likes = 0
+        self.comments = 0
+        # [(views, post id)], most viewed first
+        self.top = []
+
+    def as_dict(self):
+        return {
+            'posts': self.posts,
+            'statuses': dict(self.statuses),
+            'views': self.views,
+            'likes': self.likes,
+            'comments': self.comments,
+        }
+
+
+class AuthorStats:
+    """Per-author dashboard numbers, maintained as writes happen
+
+    Each write adjusts the totals of the post's author and, for views,
+    offers the post to the author's top-k list.  View counts only grow, so
+    that list stays exact without ever looking at the author's other
+    posts; a dashboard read copies a few numbers and k ids.
+    """
+
+    def __init__(self, k=5):
+        self.k = k
+        self._authors = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._authors)
+
+    def _totals(self, author_id):
+        totals = self._authors.get(author_id)
+        if totals is None:
+            totals = self._authors[author_id] = AuthorTotals()
+        return totals
+
+    def _offer(self, totals, post):
+        """Put the post at its place in the top list if its views rank"""
+        top = [entry for entry in totals.top if entry[1] != post['id']]
+        entry = (post['views'], post['id'])
+        if len(top) < self.k or entry > top[-1]:
+            top.append(entry)
+            top.sort(reverse=True)
+            del top[self.k:]
+            totals.top = top
+
+    def _add_post(self, post):
+        totals = self._totals(post['author_id'])
+        totals.posts += 1
+        totals.statuses[post['status']] = totals.statuses.get(post['status'], 0) + 1
+        totals.views += post['views']
+        totals.likes += post['likes']
+        totals.comments += post['comment_count']
+        self._offer(totals, post)
+
+    def get(self, author_id):
+        """(totals dict, [top post ids]) for an author; zeros if they have no posts"""
+        with self._lock:
+            totals = self._authors.get(author_id) or AuthorTotals()
+            return totals.as_dict(), [post_id for _, post_id in totals.top]
+
+    def on_store_event(self, event, post, **extra):
+        """PostStore listener keeping the author of each write up to date"""
+        with self._lock:
+            if event == 'post_added':
+                self._add_post(post)
+            elif event == 'posts_added':
+                for added in extra['posts']:
+                    self._add_post(added)
+            elif event == 'views_added':
+                totals = self._totals(post['author_id'])
+                totals.views += extra['count']
+                self._offer(totals, post)
+            elif event == 'comment_added':
+                self._totals(post['author_id']).comments += 1
+            elif event == 'post_liked':
+                self._totals(post['author_id']).likes += 1
+            elif event == 'post_unliked':
+                self._totals(post['author_id']).likes -= 1
+            elif event == 'post_updated' and 'status' in extra.get('previous', {}):
+                statuses = self._totals(post['author_id']).statuses
+                previous = extra['previous']['status']
+                statuses[previous] = statuses.get(previous, 0) - 1
+                statuses[post['status']] = statuses.get(post['status'], 0) + 1
@@ -0,0 +1,261 @@
+import mmap
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Garbage in the spill file is only reclaimed once there is at least this much
+MIN_COMPACT_BYTES = 4 * 1024 * 1024
+
+
+def comment_size(comment):
+    """Rough number of bytes a comment dict keeps alive"""
+    return sys.getsizeof(comment) + sum(sys.getsizeof(value) for value in comment.values())
+
+
+def body_size(content, comments):
+    """Rough number of bytes a post's content and comment list keep alive"""
+    return sys.getsizeof(content) + sys.getsizeof(comments) + sum(map(comment_size, comments))
+
+
+class BodyStore:
+    """Post content and comment lists under a memory budget, cold ones on disk
+
+    Resident bodies sit in an LRU of [content, comments, size] entries whose
+    sizes add up to at most max_bytes (None: no limit, nothing is written).
+    Going over pickles the least recently used bodies to an anonymous spill
+    file; reading one back maps the file, unpickles just its slice and makes
+    it resident again.  A body evicted again unchanged keeps its copy in the
+    file; changing it turns that copy into garbage, which is reclaimed by
+    rewriting the file once it outweighs the live copies.  The file is only
+    a cache (the event log stays the record) and goes away with the process.
+
+    Reads with promote=False (exports, search) load a cold body without
+    making it resident or moving it in the LRU, so a full scan does not
+    flush the bodies readers actually use.  Snapshots read nothing at all
+    while they hold the lock; see snapshot().
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.faults = 0
+        self.evictions = 0
+        self.writes = 0
+        self.compactions = 0
+        self.fault_seconds = 0.0
+        self.max_fault_seconds = 0.0
+        self._resident = OrderedDict()
+        # post id -> (offset, length) of an up-to-date copy in the spill file
+        self._on_disk = {}
+        self._file = None
+        self._map = None
+        self._file_bytes = 0
+        self._dead_bytes = 0
+        self._lock = threading.Lock()
+
+    # Spill file
+
+    def _new_file(self):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        return tempfile.TemporaryFile(prefix='bodies-', dir=self.directory)
+
+    def _write(self, content, comments):
+        data = pickle.dumps((content, comments), protocol=pickle.HIGHEST_PROTOCOL)
+        if self._file is None:
+            self._file = self._new_file()
+        offset = self._file_bytes
+        self._file.write(data)
+        self._file_bytes += len(data)
+        self.writes += 1
+        return offset, len(data)
+
+    def _mapped(self, end):
+        """The file mapping, remapped if it does not reach `end` yet"""
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _read(self, location):
+        offset, length = location
+        return pickle.loads(self._mapped(offset + length)[offset:offset + length])
+
+    def _compact(self):
+        """Rewrite the spill file with only the live copies"""
+        mapped = self._mapped(self._file_bytes)
+        new_file, offset, locations = self._new_file(), 0, {}
+        for post_id, (start, length) in self._on_disk.items():
+            new_file.write(mapped[start:start + length])
+            locations[post_id] = (offset, length)
+            offset += length
+        self._map.close()
+        self._file.close()
+        self._file, self._map = new_file, None
+        self._on_disk = locations
+        self._file_bytes, self._dead_bytes = offset, 0
+        self.compactions += 1
+
+    # Memory
+
+    def _insert(self, post_id, entry):
+        self._resident[post_id] = entry
+        self.resident_bytes += entry[2]
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self.resident_bytes > self.max_bytes and self._resident:
+            post_id, entry = self._resident.popitem(last=False)
+            self.resident_bytes -= entry[2]
+            if post_id not in self._on_disk:
+                self._on_disk[post_id] = self._write(entry[0], entry[1])
+            self.evictions += 1
+        if self._dead_bytes and self._dead_bytes >= max(MIN_COMPACT_BYTES, self._file_bytes - self._dead_bytes):
+            self._compact()
+
+    def _entry(self, post_id, promote=True):
+        """The [content, comments, size] entry of a post, read back if cold; None if unknown"""
+        entry = self._resident.get(post_id)
+        if entry is not None:
+            if promote:
+                self._resident.move_to_end(post_id)
+            self.hits += 1
+            return entry
+        location = self._on_disk.get(post_id)
+        if location is None:
+            return None
+        started = time.perf_counter()
+        content, comments = self._read(location)
+        elapsed = time.perf_counter() - started
+        self.faults += 1
+        self.fault_seconds += elapsed
+        self.max_fault_seconds = max(self.max_fault_seconds, elapsed)
+        entry = [content, comments, body_size(content, comments)]
+        if promote:
+            # The caller evicts once it is done with the entry
+            self._insert(post_id, entry)
+        return entry
+
+    def _changing(self, post_id):
+        """The resident entry of a post about to change; its disk copy becomes garbage"""
+        entry = self._entry(post_id)
+        if entry is None:
+            entry = ['', [], body_size('', [])]
+            self._insert(post_id, entry)
+        location = self._on_disk.pop(post_id, None)
+        if location is not None:
+            self._dead_bytes += location[1]
+        return entry
+
+    # Reads
+
+    def content(self, post_id, promote=True):
+        """A post's content, or None if it has no body"""
+        with self._lock:
+            entry = self._entry(post_id, promote)
+            self._evict()
+            return entry[0] if entry is not None else None
+
+    def comments(self, post_id, promote=True):
+        """A post's stored comment list, oldest first; copy it, never change it"""
+        with self._lock:
+            entry = self._entry(post_id, promote)
+            self._evict()
+            return entry[1] if entry is not None else []
+
+    # Writes
+
+    def put(self, post_id, content, comments=()):
+        """Store a new post's body; it starts out resident"""
+        comments = list(comments)
+        with self._lock:
+            self._insert(post_id, [content, comments, body_size(content, comments)])
+            self._evict()
+
+    def set_content(self, post_id, content):
+        with self._lock:
+            entry = self._changing(post_id)
+            size = sys.getsizeof(content) - sys.getsizeof(entry[0])
+            entry[0] = content
+            entry[2] += size
+            self.resident_bytes += size
+            self._evict()
+
+    def add_comment(self, post_id, comment):
+        with self._lock:
+            entry = self._changing(post_id)
+            entry[1].append(comment)
+            size = comment_size(comment)
+            entry[2] += size
+            self.resident_bytes += size
+            self._evict()
+
+    # Snapshots
+
+    def snapshot(self, post_ids):
+        """The bodies of post_ids as they are now, pickled later; yields (post id, bytes)
+
+        Only references are taken here: a resident body's content and the
+        length of its comment list (comments are only ever appended), or a
+        cold body's slice of the spill file, which is never overwritten and
+        stays mapped even if compaction replaces the file.  Iterating pickles
+        resident bodies one at a time and copies cold ones as they are, so a
+        snapshot neither holds the lock while it works nor loads the archive.
+        """
+        plan, cold = [], False
+        with self._lock:
+            for post_id in post_ids:
+                entry = self._resident.get(post_id)
+                if entry is not None:
+                    plan.append((post_id, entry[0], entry[1], len(entry[1])))
+                elif post_id in self._on_disk:
+                    plan.append((post_id, None, self._on_disk[post_id], 0))
+                    cold = True
+                else:
+                    plan.append((post_id, '', [], 0))
+            mapped = None
+            if cold:
+                self._file.flush()
+                mapped = mmap.mmap(self._file.fileno(), self._file_bytes, access=mmap.ACCESS_READ)
+        return self._stream_snapshot(plan, mapped)
+
+    @staticmethod
+    def _stream_snapshot(plan, mapped):
+        try:
+            for post_id, content, comments, count in plan:
+                if content is None:
+                    offset, length = comments
+                    yield post_id, mapped[offset:offset + length]
+                else:
+                    yield post_id, pickle.dumps((content, comments[:count]), protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+    def stats(self):
+        lookups = self.hits + self.faults
+        return {
+            'resident_posts': len(self._resident),
+            'resident_bytes': self.resident_bytes,
+            'max_bytes': self.max_bytes,
+            'disk_posts': len(self._on_disk),
+            'file_bytes': self._file_bytes,
+            'garbage_bytes': self._dead_bytes,
+            'hits': self.hits,
+            'faults': self.faults,
+            'evictions': self.evictions,
+            'writes': self.writes,
+            'compactions': self.compactions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'avg_fault_ms': round(self.fault_seconds * 1000 / self.faults, 3) if self.faults else 0.0,
+            'max_fault_ms': round(self.max_fault_seconds * 1000, 3),
+        }
@@ -0,0 +1,204 @@
+import json
+import re
+import uuid
+from datetime import datetime
+
+from blog_store import POST_STATUSES
+
+# Posts inserted (and made durable) per PostStore.add_many call
+BATCH_SIZE = 1000
+
+# Longest accepted NDJSON line; anything longer is rejected unread
+MAX_LINE_BYTES = 1024 * 1024
+
+# Bytes read from the request body at a time
+READ_CHUNK = 64 * 1024
+
+# Rejected lines reported back in full; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIMESTAMP_RE = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+
+
+def read_lines(stream, max_bytes=MAX_LINE_BYTES, chunk_size=READ_CHUNK):
+    """Yield (line number, bytes or None) from a body, reading it incrementally
+
+    The body is read in fixed-size chunks (the WSGI input's own readline
+    goes a byte at a time), so only a chunk and one partial line are held.
+    A line longer than max_bytes is skipped and yielded as None so the
+    caller can report it.
+    """
+    number, buffer, skipping = 0, b'', False
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (buffer + chunk).split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            number += 1
+            if skipping:
+                skipping = False
+                yield number, None
+            else:
+                yield number, line if len(line) <= max_bytes else None
+        if len(buffer) > max_bytes:
+            # Drop the oversized line's head; its end is reported when found
+            buffer, skipping = b'', True
+    if buffer or skipping:
+        yield number + 1, None if skipping or len(buffer) > max_bytes else buffer
+
+
+def _new_id():
+    return str(uuid.uuid4())
+
+
+def _text(data, name, default=None, required=True):
+    value = data[name] if name in data else default() if callable(default) else default
+    if not isinstance(value, str) or (required and not value.strip()):
+        raise ValueError(f"'{name}' must be a non-empty string" if required else f"'{name}' must be a string")
+    return value
+
+
+def _timestamp(data, name, default):
+    value = data.get(name, default)
+    if not isinstance(value, str):
+        raise ValueError(f"'{name}' must be a string")
+    # The pattern fixes the format; fromisoformat (much cheaper than
+    # strptime) then rejects impossible dates
+    try:
+        if not TIMESTAMP_RE.fullmatch(value):
+            raise ValueError
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must look like 2024-01-15 10:00:00")
+    return value
+
+
+def _count(data, name):
+    value = data.get(name, 0)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"'{name}' must be a non-negative integer")
+    return value
+
+
+def parse_post(data, now):
+    """Validate one imported record; returns (post, comments) or raises ValueError
+
+    Only known fields are kept.  id, timestamps, counters and status get
+    the same defaults /new-post would use; comment_count is recomputed.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Each line must be a JSON object')
+    tags = data.get('tags', [])
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("'tags' must be a list of strings")
+    created_at = _timestamp(data, 'created_at', now)
+    post = {
+        'id': _text(data, 'id', _new_id),
+        'title': _text(data, 'title'),
+        'content': _text(data, 'content'),
+        'author_id': _text(data, 'author_id'),
+        'author_name': _text(data, 'author_name'),
+        'tags': [tag.strip() for tag in tags if tag.strip()],
+        'status': _text(data, 'status', 'published'),
+        'publish_at': None,
+        'created_at': created_at,
+        'updated_at': _timestamp(data, 'updated_at', created_at),
+        'views': _count(data, 'views'),
+        'likes': _count(data, 'likes'),
+    }
+    if post['status'] not in POST_STATUSES:
+        raise ValueError(f"'status' must be one of {', '.join(POST_STATUSES)}")
+    if post['status'] == 'scheduled':
+        post['publish_at'] = _timestamp(data, 'publish_at', None)
+
+    raw_comments = data.get('comments', [])
+    if not isinstance(raw_comments, list):
+        raise ValueError("'comments' must be a list")
+    comments = []
+    for raw in raw_comments:
+        if not isinstance(raw, dict):
+            raise ValueError('Each comment must be a JSON object')
+        comments.append({
+            'id': _text(raw, 'id', _new_id),
+            'content': _text(raw, 'content'),
+            'author': _text(raw, 'author'),
+            'author_id': _text(raw, 'author_id', '', required=False),
+            'created_at': _timestamp(raw, 'created_at', created_at),
+        })
+    return post, comments
+
+
+def import_posts(lines, store, after_batch=None, batch_size=BATCH_SIZE):
+    """Insert posts from (line number, bytes) pairs in batches of batch_size
+
+    Bad lines are skipped and reported; good ones are handed to
+    store.add_many, after which after_batch() runs (e.g. to wait for the
+    event log).  Memory use is one batch, whatever the input size.
+    Returns a summary dict with imported, failed and errors.
+    """
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+    batch, batch_ids = [], set()
+    now = datetime.now().strftime(TIME_FORMAT)
+
+    def reject(line_number, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'line': line_number, 'error': message})
+
+    def flush(last_line):
+        try:
+            store.add_many(batch)
+        except ValueError as e:
+            # Another writer took an id since it was checked
+            summary['failed'] += len(batch)
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append({'line': last_line, 'error': f'Batch of {len(batch)} posts rejected: {e}'})
+        else:
+            summary['imported'] += len(batch)
+            if after_batch is not None:
+                after_batch()
+        batch.clear()
+        batch_ids.clear()
+
+    line_number = 0
+    for line_number, line in lines:
+        if line is None:
+            reject(line_number, f'Line is longer than {MAX_LINE_BYTES} bytes')
+            continue
+        if not line.strip():
+            continue
+        try:
+            post, comments = parse_post(json.loads(line), now)
+        except ValueError as e:
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors too
+            reject(line_number, str(e))
+            continue
+        if post['id'] in batch_ids or post['id'] in store:
+            reject(line_number, f"Post {post['id']} already exists")
+            continue
+        batch.append((post, comments))
+        batch_ids.add(post['id'])
+        if len(batch) >= batch_size:
+            flush(line_number)
+    if batch:
+        flush(line_number)
+    return summary
+
+
+def export_posts(store, batch_size=BATCH_SIZE):
+    """Every post with its comments, newest first, fetched a page at a time
+
+    Keyset paging means posts added while the export runs are simply not
+    included, and no list of all posts is ever built.
+    """
+    cursor = None
+    while True:
+        page, cursor = store.page(batch_size, cursor)
+        for post in page:
+            # Read without making paged-out bodies resident again
+            yield dict(store.with_content(post, promote=False), comments=store.comments(post['id'], promote=False))
+        if cursor is None:
+            return
@@ -0,0 +1,153 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """LRU cache of rendered HTML fragments
+
+    Entries are stored per key (a post id) together with the version they
+    were rendered from; a lookup with a different version re-renders just
+    that one fragment.  hits/misses are kept so the hit rate can be checked.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_render(self, key, version, render):
+        """Return the cached fragment for key/version, calling render() on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        html = render()
+        with self._lock:
+            self._entries[key] = (version, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedPage:
+    """A rendered page body, kept both plain and gzip-compressed"""
+
+    __slots__ = ('body', 'gzipped', 'tags')
+
+    def __init__(self, body, tags):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6)
+        self.tags = tags
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzipped)
+
+
+class PageCache:
+    """LRU cache of whole pages under a byte budget, invalidated by tag
+
+    Each page is stored with the tags of what it shows (e.g. 'stats' or
+    ('post', id)); invalidate(tag) drops exactly the pages carrying it.  A
+    render that started before an invalidation is not stored, so a slow
+    render can never put back a page that was just made stale.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+        self._pages = OrderedDict()
+        self._by_tag = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, body, tags, generation):
+        """Store a page rendered when self.generation was `generation`
+
+        Returns the CachedPage (also when it was too late to be stored).
+        """
+        page = CachedPage(body, frozenset(tags))
+        with self._lock:
+            if generation != self.generation or page.size > self.max_bytes:
+                return page
+            self._remove(key)
+            self._pages[key] = page
+            self.bytes += page.size
+            for tag in page.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._pages)))
+                self.evictions += 1
+        return page
+
+    def _remove(self, key):
+        page = self._pages.pop(key, None)
+        if page is None:
+            return
+        self.bytes -= page.size
+        for tag in page.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate(self, *tags):
+        """Drop every page that carries any of the tags"""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._pages),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,99 @@
+import threading
+
+
+class _Shard:
+    """Counts recorded by one thread; only that thread ever writes to it"""
+
+    __slots__ = ('counts', 'lock', 'thread')
+
+    def __init__(self, thread):
+        self.counts = {}
+        # Shared only with the flusher, so taking it almost never waits
+        self.lock = threading.Lock()
+        self.thread = thread
+
+
+class ViewCounter:
+    """Contention-free view counting with write-behind flushes
+
+    Each request thread increments its own shard, so hit() never touches the
+    shared post dict and its shard lock is only ever contended by a flush.
+    A flush swaps every shard's dict for an empty one under that lock and
+    hands the counts to apply(increments) in one batch, so it only sees
+    posts viewed since the last flush, memory stays bounded and no hit can
+    land in a dict that has already been applied.
+    """
+
+    def __init__(self, apply, interval=1.0):
+        self.apply = apply
+        self.interval = interval
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _new_shard(self):
+        shard = _Shard(threading.current_thread())
+        with self._shards_lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def hit(self, post_id):
+        """Record one view of a post"""
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        with shard.lock:
+            shard.counts[post_id] = shard.counts.get(post_id, 0) + 1
+
+    def pending(self, post_id):
+        """Views recorded for a post but not yet flushed"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        return sum(shard.counts.get(post_id, 0) for shard in shards)
+
+    def flush(self):
+        """Apply every unflushed view in one batch; returns the number applied"""
+        with self._flush_lock:
+            with self._shards_lock:
+                shards = list(self._shards)
+            increments = {}
+            for shard in shards:
+                with shard.lock:
+                    counts, shard.counts = shard.counts, {}
+                for post_id, count in counts.items():
+                    increments[post_id] = increments.get(post_id, 0) + count
+            if increments:
+                self.apply(increments)
+            self._drop_finished(shards)
+            return sum(increments.values())
+
+    def _drop_finished(self, shards):
+        """Forget shards of threads that have exited and are fully flushed"""
+        finished = [shard for shard in shards
+                    if not shard.thread.is_alive() and not shard.counts]
+        if finished:
+            with self._shards_lock:
+                self._shards = [shard for shard in self._shards if shard not in finished]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        """Start the background flusher thread (idempotent)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and apply whatever is still pending"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
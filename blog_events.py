@@ -0,0 +1,101 @@
+import itertools
+import json
+import threading
+from collections import deque
+
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15.0
+
+
+def format_event(event_id, event, data):
+    """Encode one Server-Sent Event frame"""
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+class Subscriber:
+    """One open event stream: a bounded queue of encoded frames
+
+    The queue holds references to frames shared by every subscriber, so an
+    idle connection costs one small deque and an Event.  When a client is
+    too slow and the queue overflows, the oldest frames are dropped and the
+    client is told to resync instead of holding up the broadcaster.
+    """
+
+    __slots__ = ('topics', 'queue', 'wakeup', 'lagged')
+
+    def __init__(self, topics, max_queue):
+        self.topics = topics
+        self.queue = deque(maxlen=max_queue)
+        self.wakeup = threading.Event()
+        self.lagged = False
+
+    def push(self, frame):
+        if len(self.queue) == self.queue.maxlen:
+            self.lagged = True
+        self.queue.append(frame)
+        self.wakeup.set()
+
+
+class Broadcaster:
+    """Fans events out to subscribers of a topic without ever blocking
+
+    publish() encodes an event once and appends it to each interested
+    subscriber's queue; it never waits on a client.  Topics are plain
+    hashables such as 'posts' or ('post', id).
+    """
+
+    def __init__(self, max_queue=64):
+        self.max_queue = max_queue
+        self.published = 0
+        self._ids = itertools.count(1)
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, *topics):
+        subscriber = Subscriber(topics, self.max_queue)
+        with self._lock:
+            for topic in topics:
+                self._topics.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for topic in subscriber.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def publish(self, topics, event, data):
+        """Send an event to everyone subscribed to any of the topics"""
+        frame = format_event(next(self._ids), event, data)
+        with self._lock:
+            targets = set()
+            for topic in topics:
+                targets.update(self._topics.get(topic, ()))
+        for subscriber in targets:
+            subscriber.push(frame)
+        self.published += 1
+
+    def stream(self, subscriber):
+        """Generator of SSE bytes for a subscriber; unsubscribes when closed"""
+        try:
+            yield b'retry: 5000\n\n'
+            while True:
+                if not subscriber.wakeup.wait(KEEPALIVE_INTERVAL):
+                    yield b': keepalive\n\n'
+                    continue
+                subscriber.wakeup.clear()
+                if subscriber.lagged:
+                    subscriber.lagged = False
+                    subscriber.queue.clear()
+                    yield format_event(0, 'resync', {})
+                    continue
+                frames = []
+                while subscriber.queue:
+                    frames.append(subscriber.queue.popleft())
+                if frames:
+                    yield b''.join(frames)
+        finally:
+            self.unsubscribe(subscriber)
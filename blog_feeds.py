@@ -0,0 +1,202 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape, quoteattr
+
+# Post fields that appear in a feed; other writes (views, likes, comments) leave feeds alone
+FEED_FIELDS = frozenset(('title', 'content', 'tags', 'status', 'created_at', 'updated_at', 'author_name'))
+
+
+def _utc(value):
+    """A stored local 'YYYY-MM-DD HH:MM:SS' time as an aware UTC datetime"""
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc)
+    except (TypeError, ValueError):
+        return datetime.now(timezone.utc)
+
+
+def render_atom(title, site_url, feed_url, posts):
+    """Atom 1.0 document for the posts, newest first"""
+    updated = max((_utc(post['updated_at']) for post in posts), default=datetime.now(timezone.utc))
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n',
+        '<feed xmlns="http://www.w3.org/2005/Atom">\n',
+        f'<title>{escape(title)}</title>\n',
+        f'<link href={quoteattr(site_url)}/>\n',
+        f'<link rel="self" href={quoteattr(feed_url)}/>\n',
+        f'<id>{escape(feed_url)}</id>\n',
+        f'<updated>{updated.isoformat()}</updated>\n',
+    ]
+    for post in posts:
+        link = f"{site_url}post/{post['id']}"
+        parts.append(
+            '<entry>\n'
+            f"<title>{escape(post['title'])}</title>\n"
+            f'<link href={quoteattr(link)}/>\n'
+            f'<id>{escape(link)}</id>\n'
+            f"<published>{_utc(post['created_at']).isoformat()}</published>\n"
+            f"<updated>{_utc(post['updated_at']).isoformat()}</updated>\n"
+            f"<author><name>{escape(post['author_name'])}</name></author>\n"
+            + ''.join(f'<category term={quoteattr(tag)}/>\n' for tag in post['tags'])
+            + f"<content type=\"text\">{escape(post['content'])}</content>\n"
+            '</entry>\n'
+        )
+    parts.append('</feed>\n')
+    return ''.join(parts).encode()
+
+
+def render_rss(title, site_url, feed_url, posts):
+    """RSS 2.0 document for the posts, newest first"""
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n',
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n<channel>\n',
+        f'<title>{escape(title)}</title>\n',
+        f'<link>{escape(site_url)}</link>\n',
+        f'<description>{escape(title)}</description>\n',
+        f'<atom:link href={quoteattr(feed_url)} rel="self" type="application/rss+xml"/>\n',
+    ]
+    for post in posts:
+        link = f"{site_url}post/{post['id']}"
+        parts.append(
+            '<item>\n'
+            f"<title>{escape(post['title'])}</title>\n"
+            f'<link>{escape(link)}</link>\n'
+            f'<guid isPermaLink="true">{escape(link)}</guid>\n'
+            f"<pubDate>{format_datetime(_utc(post['created_at']))}</pubDate>\n"
+            f"<author>{escape(post['author_name'])}</author>\n"
+            + ''.join(f'<category>{escape(tag)}</category>\n' for tag in post['tags'])
+            + f"<description>{escape(post['content'])}</description>\n"
+            '</item>\n'
+        )
+    parts.append('</channel>\n</rss>\n')
+    return ''.join(parts).encode()
+
+
+class CachedFeed:
+    """A rendered feed with the validators computed once at render time"""
+
+    __slots__ = ('body', 'etag', 'last_modified', 'scope')
+
+    def __init__(self, body, scope):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.scope = scope
+
+
+class FeedCache:
+    """Rendered feeds as bytes, dropped only when a post they show changes
+
+    Keys are (format, scope, site url) with scope ('all',), ('tag', tag) or
+    ('author', author id).  The post store listener works out which scopes
+    a write touches and drops just those feeds; a poll of a cached feed is
+    a dict lookup that never reaches the post store.  A miss renders
+    outside the cache lock; other misses on the same key wait for that one
+    render, so a burst of polls after a change renders each feed once while
+    different feeds render side by side.  A render that raced with an
+    invalidation is not stored.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.invalidations = 0
+        self.generation = 0
+        self._feeds = OrderedDict()
+        self._by_scope = {}
+        self._lock = threading.Lock()
+        # key -> Event set when the render in progress for it finishes
+        self._rendering = {}
+
+    def __len__(self):
+        return len(self._feeds)
+
+    def get_or_render(self, key, render):
+        """The cached feed for key, calling render() -> bytes on a miss"""
+        while True:
+            with self._lock:
+                feed = self._feeds.get(key)
+                if feed is not None:
+                    self._feeds.move_to_end(key)
+                    self.hits += 1
+                    return feed
+                done = self._rendering.get(key)
+                if done is None:
+                    done = self._rendering[key] = threading.Event()
+                    self.misses += 1
+                    generation = self.generation
+                    break
+            # Another request is rendering this feed; use its result
+            done.wait()
+        try:
+            feed = CachedFeed(render(), key[1])
+            with self._lock:
+                self.renders += 1
+                if generation == self.generation:
+                    self._feeds[key] = feed
+                    self._by_scope.setdefault(feed.scope, set()).add(key)
+                    while len(self._feeds) > self.max_entries:
+                        self._remove(next(iter(self._feeds)))
+        finally:
+            with self._lock:
+                del self._rendering[key]
+            done.set()
+        return feed
+
+    def _remove(self, key):
+        feed = self._feeds.pop(key, None)
+        if feed is None:
+            return
+        keys = self._by_scope.get(feed.scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_scope[feed.scope]
+
+    def invalidate(self, *scopes):
+        with self._lock:
+            self.generation += 1
+            for scope in scopes:
+                for key in list(self._by_scope.get(scope, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    @staticmethod
+    def _scopes(post, previous):
+        scopes = {('all',), ('author', post['author_id'])}
+        scopes.update(('tag', tag) for tag in post['tags'])
+        scopes.update(('tag', tag) for tag in previous.get('tags') or ())
+        return scopes
+
+    def on_store_event(self, event, post, **extra):
+        """PostStore listener dropping the feeds a published post appears in"""
+        if event == 'post_added':
+            if post['status'] == 'published':
+                self.invalidate(*self._scopes(post, {}))
+        elif event == 'posts_added':
+            scopes = set()
+            for added in extra['posts']:
+                if added['status'] == 'published':
+                    scopes.update(self._scopes(added, {}))
+            if scopes:
+                self.invalidate(*scopes)
+        elif event == 'post_updated' and FEED_FIELDS.intersection(extra.get('fields', ())):
+            previous = extra.get('previous', {})
+            if 'published' in (post['status'], previous.get('status')):
+                self.invalidate(*self._scopes(post, previous))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._feeds),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'renders': self.renders,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,111 @@
+import hashlib
+import math
+import threading
+
+# 2 ** PRECISION one-byte registers per sketch: 1 KB, about 3% standard error
+PRECISION = 10
+
+
+def hash64(value):
+    """Stable 64-bit hash of a string (unlike hash(), the same in every process)"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Cardinality estimate in a fixed 2 ** precision bytes
+
+    Each hashed item updates one register to the maximum number of leading
+    zeros seen there; the harmonic mean of the registers gives the estimate,
+    with linear counting while many registers are still empty.
+    """
+
+    __slots__ = ('precision', 'registers', '_estimate')
+
+    def __init__(self, precision=PRECISION, registers=None):
+        self.precision = precision
+        size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(size)
+        if len(self.registers) != size:
+            raise ValueError(f'Expected {size} registers, got {len(self.registers)}')
+        self._estimate = None
+
+    def add_hash(self, h):
+        """Add a 64-bit hash; returns (register, rank) if it raised one, else None"""
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank <= self.registers[index]:
+            return None
+        self.registers[index] = rank
+        self._estimate = None
+        return index, rank
+
+    def merge_register(self, index, rank):
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            self._estimate = None
+
+    def estimate(self):
+        """Estimated number of distinct items added (cached until a register changes)"""
+        if self._estimate is None:
+            m = len(self.registers)
+            alpha = 0.7213 / (1 + 1.079 / m)
+            raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+            zeros = self.registers.count(0)
+            if raw <= 2.5 * m and zeros:
+                raw = m * math.log(m / zeros)
+            self._estimate = int(round(raw))
+        return self._estimate
+
+
+class UniqueViewers:
+    """One HyperLogLog per post, created on the post's first view
+
+    Memory per viewed post is fixed at 2 ** precision bytes whatever the
+    traffic.  add() reports register changes so the caller can log them;
+    they get rarer as a sketch fills, and replaying them in any order (or
+    twice) rebuilds the same sketch.
+    """
+
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self._sketches = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sketches)
+
+    def _sketch(self, post_id):
+        sketch = self._sketches.get(post_id)
+        if sketch is None:
+            with self._lock:
+                sketch = self._sketches.setdefault(post_id, HyperLogLog(self.precision))
+        return sketch
+
+    def add(self, post_id, visitor):
+        """Count a visitor; returns (register, rank) if the sketch changed"""
+        h = hash64(visitor)
+        sketch = self._sketch(post_id)
+        with self._lock:
+            return sketch.add_hash(h)
+
+    def merge_register(self, post_id, index, rank):
+        sketch = self._sketch(post_id)
+        with self._lock:
+            sketch.merge_register(index, rank)
+
+    def estimate(self, post_id):
+        sketch = self._sketches.get(post_id)
+        if sketch is None:
+            return 0
+        with self._lock:
+            return sketch.estimate()
+
+    def export(self):
+        """{post id: register bytes} for snapshots"""
+        with self._lock:
+            return {post_id: bytes(sketch.registers) for post_id, sketch in self._sketches.items()}
+
+    def load(self, post_id, registers):
+        with self._lock:
+            self._sketches[post_id] = HyperLogLog(self.precision, registers)
@@ -0,0 +1,245 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class JobType:
+    """A named kind of job: its handler, retry policy and counters"""
+
+    def __init__(self, name, handler, retries=3, backoff=0.5, coalesce=True):
+        self.name = name
+        self.handler = handler
+        self.retries = retries
+        self.backoff = backoff
+        self.coalesce = coalesce
+        self.enqueued = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+        # The message stays here; stats() only reports the exception type,
+        # as it is served to anyone
+        self.last_error = None
+        self.last_error_type = None
+
+    def stats(self):
+        runs = self.completed + self.failed + self.retried
+        return {
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'avg_wait_ms': round(self.wait_seconds * 1000 / runs, 3) if runs else 0.0,
+            'max_wait_ms': round(self.max_wait_seconds * 1000, 3),
+            'avg_run_ms': round(self.run_seconds * 1000 / runs, 3) if runs else 0.0,
+            'max_run_ms': round(self.max_run_seconds * 1000, 3),
+            'last_error_type': self.last_error_type,
+        }
+
+
+class Job:
+    __slots__ = ('type', 'key', 'args', 'attempts', 'queued_at')
+
+    def __init__(self, name, key, args):
+        self.type = name
+        self.key = key
+        self.args = args
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class JobQueue:
+    """In-process background jobs on a fixed pool of worker threads
+
+    Jobs are enqueued by type name with an optional key.  Jobs with the same
+    type and key never run at the same time; while one is waiting, another
+    enqueue of it is dropped (coalesced), so handlers should read the
+    current state rather than rely on their arguments being the latest.
+    Types registered with coalesce=False queue every job and run those with
+    the same key one at a time in enqueue order.  A handler that raises is
+    retried with exponential backoff, up to the type's retry limit.
+
+    Waiting jobs sit in a heap of (ready time, sequence, job) that the
+    workers sleep on.  Before start(), after stop() and whenever max_pending
+    jobs are already waiting, enqueue() runs the job in the caller instead:
+    startup builds derived state inline, and a backlog slows writers down
+    rather than growing without bound or dropping work.  stop() drains
+    everything still queued, retries included, before the workers exit.
+    """
+
+    def __init__(self, workers=4, max_pending=10000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ran_inline = 0
+        self.max_depth = 0
+        self._types = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._pending = {}
+        self._running = set()
+        self._deferred = {}
+        self._active = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._started = False
+        self._stopping = False
+
+    def __len__(self):
+        return len(self._heap) + sum(map(len, self._deferred.values()))
+
+    def register(self, name, handler, retries=3, backoff=0.5, coalesce=True):
+        """Add a job type; handler(*args) runs for each of its jobs"""
+        self._types[name] = JobType(name, handler, retries, backoff, coalesce)
+
+    def enqueue(self, name, *args, key=None):
+        """Queue a job and return at once (see the class docs for when it runs inline)"""
+        job_type = self._types[name]
+        job = Job(name, key, args)
+        with self._cond:
+            job_type.enqueued += 1
+            pending_key = (name, key)
+            if key is not None and job_type.coalesce and pending_key in self._pending:
+                job_type.coalesced += 1
+                return
+            inline = not self._started or self._stopping or len(self) >= self.max_pending
+            if inline:
+                self.ran_inline += 1
+            else:
+                if key is not None and job_type.coalesce:
+                    self._pending[pending_key] = job
+                self._push(job, job.queued_at)
+                return
+        self._execute(job, retry=False)
+
+    def _push(self, job, ready_at):
+        heapq.heappush(self._heap, (ready_at, next(self._sequence), job))
+        self.max_depth = max(self.max_depth, len(self._heap))
+        self._cond.notify()
+
+    def _execute(self, job, retry=True):
+        """Run one job; returns True if it failed and was queued again"""
+        job_type = self._types[job.type]
+        started = time.monotonic()
+        job.attempts += 1
+        try:
+            job_type.handler(*job.args)
+            error = None
+        except Exception as e:
+            error = e
+        finished = time.monotonic()
+        with self._cond:
+            wait = started - job.queued_at
+            job_type.wait_seconds += wait
+            job_type.max_wait_seconds = max(job_type.max_wait_seconds, wait)
+            job_type.run_seconds += finished - started
+            job_type.max_run_seconds = max(job_type.max_run_seconds, finished - started)
+            if error is None:
+                job_type.completed += 1
+                return False
+            job_type.last_error = f'{type(error).__name__}: {error}'
+            job_type.last_error_type = type(error).__name__
+            pending_key = (job.type, job.key)
+            # A newer copy of a coalescing job already covers this one
+            superseded = job.key is not None and job_type.coalesce and pending_key in self._pending
+            if not retry or job.attempts > job_type.retries or superseded:
+                job_type.failed += 1
+                return False
+            job_type.retried += 1
+            job.queued_at = finished
+            if job.key is not None and job_type.coalesce:
+                self._pending[pending_key] = job
+            delay = job_type.backoff * 2 ** (job.attempts - 1)
+            self._push(job, finished if self._stopping else finished + delay)
+            return True
+
+    def _next(self):
+        """Block for the next runnable job (None once stopped and drained)"""
+        while True:
+            if self._heap and (self._stopping or self._heap[0][0] <= time.monotonic()):
+                _, _, job = heapq.heappop(self._heap)
+                if job.key is None:
+                    return job
+                pending_key = (job.type, job.key)
+                if pending_key in self._running:
+                    # Queued behind the running one; that worker runs it next
+                    self._deferred.setdefault(pending_key, deque()).append(job)
+                    continue
+                if self._pending.get(pending_key) is job:
+                    del self._pending[pending_key]
+                self._running.add(pending_key)
+                return job
+            if self._stopping and not self._heap:
+                return None
+            timeout = max(self._heap[0][0] - time.monotonic(), 0) if self._heap else None
+            self._cond.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                if job is None:
+                    return
+                self._active += 1
+            while job is not None:
+                self._execute(job)
+                with self._cond:
+                    pending_key = (job.type, job.key)
+                    deferred = self._deferred.get(pending_key)
+                    if deferred:
+                        job = deferred.popleft()
+                        if not deferred:
+                            del self._deferred[pending_key]
+                        if self._pending.get(pending_key) is job:
+                            del self._pending[pending_key]
+                    else:
+                        job = None
+                        self._running.discard(pending_key)
+                        self._active -= 1
+                        self._cond.notify_all()
+
+    def start(self):
+        with self._cond:
+            self._started = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout=None):
+        """Wait until nothing is queued or running; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._heap or self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self, timeout=10.0):
+        """Stop taking jobs, run everything still queued, then end the workers"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._threads = []
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'depth': len(self),
+                'max_depth': self.max_depth,
+                'running': self._active,
+                'ran_inline': self.ran_inline,
+                'jobs': {name: job_type.stats() for name, job_type in self._types.items()},
+            }
@@ -0,0 +1,70 @@
+import json
+
+from flask import Response
+
+# Flush to the client once this many bytes of encoded records are pending
+CHUNK_SIZE = 64 * 1024
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def encode_record(record, exclude=()):
+    """Encode a dict as a JSON object, leaving out the excluded keys
+
+    Fields are written straight from the original dict, so dropping a
+    private field (password_hash) needs no copy of the record.
+    """
+    if not exclude:
+        return _encode(record)
+    return '{' + ','.join(
+        _encode(key) + ':' + _encode(value)
+        for key, value in record.items() if key not in exclude
+    ) + '}'
+
+
+def _chunked(pieces):
+    """Group small string pieces into CHUNK_SIZE-ish byte chunks"""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def _json_pieces(records, exclude, head, key):
+    if key is None:
+        yield '['
+    else:
+        yield '{' + ''.join(_encode(k) + ':' + _encode(v) + ',' for k, v in head.items())
+        yield _encode(key) + ':['
+    for i, record in enumerate(records):
+        yield (',' if i else '') + encode_record(record, exclude)
+    yield ']' if key is None else ']}'
+
+
+def _ndjson_pieces(records, exclude):
+    for record in records:
+        yield encode_record(record, exclude) + '\n'
+
+
+def stream_records(records, exclude=(), head=None, key=None, ndjson=False):
+    """Streaming response encoding one record at a time
+
+    As JSON, records become an array, or the array under `key` inside an
+    object that starts with the `head` fields.  As NDJSON, each record is
+    one line and head is dropped (the caller can send it as headers).
+    """
+    if ndjson:
+        return Response(_chunked(_ndjson_pieces(records, exclude)), mimetype='application/x-ndjson')
+    return Response(_chunked(_json_pieces(records, exclude, head or {}, key)), mimetype='application/json')
+
+
+def wants_ndjson(request):
+    """True if the client asked for NDJSON via ?format= or the Accept header"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
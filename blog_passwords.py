@@ -0,0 +1,144 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+
+# scrypt cost parameters: about 16 MB and tens of milliseconds per hash
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is saturated; the caller should answer 503"""
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32)
+
+
+def hash_password(password):
+    """Salted scrypt hash as 'scrypt$n$r$p$salt$hash'"""
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}'
+
+
+def is_legacy_hash(stored):
+    """Unsalted SHA-256 hex digests from before the switch to scrypt"""
+    return not stored.startswith('scrypt$')
+
+
+def verify_password(password, stored):
+    """Check a password; returns (matches, replacement hash or None)
+
+    A replacement is produced when the stored hash is a legacy SHA-256
+    digest or uses weaker scrypt parameters than the current ones.
+    """
+    if is_legacy_hash(stored):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        if hmac.compare_digest(legacy, stored):
+            return True, hash_password(password)
+        return False, None
+
+    _, n, r, p, salt, digest = stored.split('$')
+    n, r, p = int(n), int(r), int(p)
+    if not hmac.compare_digest(_scrypt(password, bytes.fromhex(salt), n, r, p).hex(), digest):
+        return False, None
+    if (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P):
+        return True, hash_password(password)
+    return True, None
+
+
+class PasswordHasher:
+    """Bounded worker pool running the deliberately slow password KDF
+
+    Request threads only wait on a future, so a burst of logins cannot
+    stall the interpreter running the app.  At most max_pending jobs may be
+    queued or running; beyond that submit fails fast with HasherBusy
+    instead of letting latency grow without bound.
+
+    The pool is made of processes forked from this one, which never
+    re-import the app, so start() should run before the process has any
+    threads of its own; otherwise the pool is created on first use.  Where
+    fork does not exist (Windows), spawned workers would re-run the app
+    module, so threads are used instead: scrypt releases the GIL, so they
+    still hash in parallel.  If a worker dies the pool is broken for good;
+    the jobs it had fail with HasherBusy and the next one starts a new pool.
+    """
+
+    def __init__(self, workers=None, max_pending=None, timeout=10.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self.timeout = timeout
+        self.rejected = 0
+        self.pending = 0
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                if 'fork' in multiprocessing.get_all_start_methods():
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hasher')
+            return self._executor
+
+    def start(self):
+        """Fork the workers now rather than on the first request"""
+        self._pool().submit(os.getpid).result()
+
+    def _discard(self, executor):
+        """Drop a pool whose workers died so the next job gets a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy('Password hashing queue is full')
+            self.pending += 1
+        executor = self._pool()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenExecutor:
+            self._release()
+            self._discard(executor)
+            raise HasherBusy('Password hashing workers died')
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy('Password hashing timed out')
+        except BrokenExecutor:
+            self._discard(executor)
+            raise HasherBusy('Password hashing workers died')
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, password, stored):
+        """(matches, replacement hash or None); see verify_password"""
+        return self._run(verify_password, password, stored)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,81 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Token buckets per key (a client IP, a user) in a bounded LRU
+
+    Each key may make `burst` requests at once and earns back `rate` tokens
+    per second.  A bucket is just [tokens, last refill time], refilled when
+    it is next checked, so an idle key costs nothing but its entry.  Once
+    max_keys are tracked the least recently used bucket is dropped; a key
+    coming back starts full, as if it had never been seen.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key, now=None):
+        """Take a token for key; returns 0.0 if allowed, else seconds until one is due"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (1 - bucket[0]) / self.rate
+
+    def stats(self):
+        return {
+            'keys': len(self._buckets),
+            'max_keys': self.max_keys,
+            'rate_per_minute': round(self.rate * 60, 3),
+            'burst': self.burst,
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'evictions': self.evictions,
+        }
+
+
+class RateLimitPolicy:
+    """A route's limits: one bucket per client IP and one per logged-in session"""
+
+    def __init__(self, per_ip, per_session=None):
+        self.per_ip = per_ip
+        self.per_session = per_session
+
+    def check(self, ip, user_id=None):
+        """Whole seconds the client must wait before retrying, or 0 if it may go ahead"""
+        wait = self.per_ip.acquire(ip)
+        if not wait and self.per_session is not None and user_id is not None:
+            wait = self.per_session.acquire(user_id)
+        return max(math.ceil(wait), 1) if wait else 0
+
+    def stats(self):
+        stats = {'per_ip': self.per_ip.stats()}
+        if self.per_session is not None:
+            stats['per_session'] = self.per_session.stats()
+        return stats
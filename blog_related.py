@@ -0,0 +1,136 @@
+import heapq
+import threading
+from collections import deque
+
+
+class RelatedPosts:
+    """Top-k related posts per post by tag similarity, kept up to date on writes
+
+    Similarity is the Jaccard index of the two posts' tag sets, ties going
+    to the newer post.  Candidates come from a per-tag window of the most
+    recent posts, so adding a post costs O(tags * window) whatever the size
+    of the store: the new post gets its own list, and each candidate it
+    beats an entry of is updated in place.  A page view is a dict lookup.
+
+    Lists are replaced rather than mutated, so readers never need the lock.
+    """
+
+    def __init__(self, k=5, window=50):
+        self.k = k
+        self.window = window
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._recent = {}
+        self._related = {}
+        self._referenced_by = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def related(self, post_id):
+        """[(post id, score)] of the posts most similar to post_id, best first"""
+        return [(other_id, score) for score, _, other_id in self._related.get(post_id, ())]
+
+    # Maintenance
+
+    def _candidates(self, post_id, tags):
+        """{post id: shared tag count} over the recent posts of each tag"""
+        overlap = {}
+        for tag in tags:
+            for other_id in self._recent.get(tag, ()):
+                if other_id != post_id:
+                    overlap[other_id] = overlap.get(other_id, 0) + 1
+        return overlap
+
+    def _top(self, post_id):
+        tags, _ = self._docs[post_id]
+        docs = self._docs
+        scored = []
+        for other_id, shared in self._candidates(post_id, tags).items():
+            other_tags, other_created = docs[other_id]
+            scored.append((shared / (len(tags) + len(other_tags) - shared), other_created, other_id))
+        return heapq.nlargest(self.k, scored)
+
+    def _set(self, post_id, entries):
+        """Replace a post's list, keeping the reverse references in step"""
+        old = self._related.pop(post_id, ())
+        for _, _, other_id in old:
+            referrers = self._referenced_by.get(other_id)
+            if referrers is not None:
+                referrers.discard(post_id)
+                if not referrers:
+                    del self._referenced_by[other_id]
+        if entries:
+            self._related[post_id] = entries
+            for _, _, other_id in entries:
+                self._referenced_by.setdefault(other_id, set()).add(post_id)
+
+    def _offer(self, post_id, entry):
+        """Put entry into a post's list if it ranks in the top k"""
+        current = self._related.get(post_id, ())
+        if len(current) >= self.k and entry <= current[-1]:
+            return
+        i = 0
+        while i < len(current) and current[i] > entry:
+            i += 1
+        updated = [*current[:i], entry, *current[i:]]
+        if len(updated) > self.k:
+            dropped_id = updated.pop()[2]
+            referrers = self._referenced_by[dropped_id]
+            referrers.discard(post_id)
+            if not referrers:
+                del self._referenced_by[dropped_id]
+        self._related[post_id] = updated
+        self._referenced_by.setdefault(entry[2], set()).add(post_id)
+
+    def _discard(self, post_id):
+        """Forget a post, refilling the lists it appeared in"""
+        entry = self._docs.pop(post_id, None)
+        if entry is None:
+            return
+        for tag in entry[0]:
+            recent = self._recent.get(tag)
+            if recent is not None and post_id in recent:
+                recent.remove(post_id)
+        self._set(post_id, [])
+        for other_id in self._referenced_by.pop(post_id, set()):
+            self._set(other_id, self._top(other_id))
+
+    def _add(self, post):
+        post_id = post['id']
+        tags = frozenset(tag.lower() for tag in post['tags'])
+        self._discard(post_id)
+        self._docs[post_id] = (tags, post['created_at'])
+        if not tags:
+            return
+        docs, related, k, size = self._docs, self._related, self.k, len(tags)
+        created_at = post['created_at']
+        scored = []
+        for other_id, shared in self._candidates(post_id, tags).items():
+            other_tags, other_created = docs[other_id]
+            score = shared / (size + len(other_tags) - shared)
+            scored.append((score, other_created, other_id))
+            # Cheap pre-check on the score alone before a full offer
+            current = related.get(other_id)
+            if current is None or len(current) < k or score >= current[-1][0]:
+                self._offer(other_id, (score, created_at, post_id))
+        self._set(post_id, heapq.nlargest(k, scored))
+        for tag in tags:
+            recent = self._recent.get(tag)
+            if recent is None:
+                recent = self._recent[tag] = deque(maxlen=self.window)
+            recent.append(post_id)
+
+    def add(self, post):
+        """Index a post (again, if its tags changed)"""
+        with self._lock:
+            self._add(post)
+
+    def add_many(self, posts):
+        with self._lock:
+            for post in posts:
+                self._add(post)
+
+    def remove(self, post_id):
+        with self._lock:
+            self._discard(post_id)
@@ -0,0 +1,86 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+
+def parse_publish_at(value):
+    """Timestamp of a 'YYYY-MM-DD HH:MM:SS' local time, or None if unset/invalid"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class PublishScheduler:
+    """Publishes scheduled posts when their publish_at time arrives
+
+    Due times sit in a heap of (timestamp, post id) and one thread sleeps on
+    a condition until the earliest is due, so nothing polls the store.  An
+    entry is never removed when a post is rescheduled, published by hand or
+    turned back into a draft; publish(post_id, due) is expected to re-check
+    the post and ignore entries that no longer apply.
+    """
+
+    def __init__(self, publish):
+        self.publish = publish
+        self.published = 0
+        self.failed = 0
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, post_id, due):
+        with self._cond:
+            heapq.heappush(self._heap, (due, post_id))
+            # Only a new earliest entry changes how long the thread sleeps
+            if self._heap[0] == (due, post_id):
+                self._cond.notify()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='publish-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if self._stopped:
+                    return
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap))
+            for at, post_id in due:
+                try:
+                    if self.publish(post_id, at):
+                        self.published += 1
+                except Exception:
+                    # One bad post must not stop the others from going out
+                    self.failed += 1
+
+    def on_store_event(self, event, post, **extra):
+        """PostStore listener queueing every post that becomes scheduled"""
+        if event == 'posts_added':
+            for added in extra['posts']:
+                self.on_store_event('post_added', added)
+        elif event == 'post_added' or (event == 'post_updated' and
+                                       {'status', 'publish_at'} & set(extra.get('fields', ()))):
+            if post['status'] == 'scheduled':
+                due = parse_publish_at(post.get('publish_at'))
+                if due is not None:
+                    self.schedule(post['id'], due)
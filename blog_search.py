@@ -0,0 +1,341 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+PHRASE_RE = re.compile(r'"([^"]+)"')
+TAG_RE = re.compile(r'(?:^|\s)tag:(\S+)')
+
+# Common words that carry no ranking signal
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or '
+    'that the this to was were will with'.split()
+)
+
+# How much a term occurrence in each field counts towards its frequency
+FIELD_WEIGHTS = (('title', 3), ('tags', 2), ('content', 1))
+
+
+def tokenize(text):
+    """Lowercase text and split it into index terms"""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def _field_text(post, field):
+    value = post.get(field) or ''
+    if field == 'tags':
+        return ' '.join(value)
+    return value
+
+
+def parse_query(query):
+    """Split a query string into (terms, phrases, tags)
+
+    Quoted sections become phrases, tag:<name> becomes a tag filter and
+    everything else is a bag of terms that must all match.
+    """
+    tags = [t.lower() for t in TAG_RE.findall(query)]
+    query = TAG_RE.sub(' ', query)
+    phrases = [tokenize(p) for p in PHRASE_RE.findall(query)]
+    phrases = [p for p in phrases if p]
+    terms = tokenize(PHRASE_RE.sub(' ', query))
+    return terms, phrases, tags
+
+
+def _positions(posting):
+    """A posting's positions as a tuple (single ones are stored as a bare int)"""
+    return (posting,) if isinstance(posting, int) else posting
+
+
+def _weighted_tf(posting, ends):
+    """Field-weighted frequency of a term from its positions and the field ends"""
+    positions = _positions(posting)
+    tf, start = 0, 0
+    for (_, weight), end in zip(FIELD_WEIGHTS, ends):
+        index = bisect.bisect_left(positions, end, start)
+        tf += weight * (index - start)
+        start = index
+    return tf
+
+
+def _shortest(length):
+    """Lower bound of a document length's impact class (its top three bits)"""
+    shift = max(length.bit_length() - 3, 0)
+    return length >> shift << shift
+
+
+class SearchIndex:
+    """Inverted index over post title, content and tags with BM25 ranking
+
+    Postings map term -> {post_id: positions}, counting positions through
+    the title, tags and content in turn (with a gap between fields), so
+    phrase queries are checked against the postings alone.  A position
+    that is a term's only one in a post is stored as a bare int.
+
+    Each term's postings are also grouped into impact buckets keyed by
+    (weighted tf, length class), whose BM25 contribution is bounded by the
+    class's shortest length.  Ranking walks the buckets best bound first,
+    scoring each matching post in full once, and stops as soon as the k-th
+    best score beats the sum of the bounds still ahead (the threshold
+    algorithm), so a query on a common term scores a handful of buckets
+    instead of every post it matches.  Buckets are plain lists: removing a
+    post leaves its entries behind, which only cost a skipped lookup, and a
+    term's buckets are rebuilt once such stale entries outnumber its posts.
+
+    Documents are added and removed one at a time so the index never needs
+    a full rebuild.  Recent query results are cached until the next write
+    bumps the generation.  For posts stored without their content,
+    content(post_id) is called to read it when a post is indexed.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, cache_size=256, content=None):
+        self.k1 = k1
+        self.b = b
+        self.cache_size = cache_size
+        self.content = content
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()
+        self._generation = 0
+        self._postings = {}
+        self._impacts = {}
+        self._stale = {}
+        self._doc_lengths = {}
+        self._field_ends = {}
+        self._doc_terms = {}
+        self._docs = {}
+        self._tags = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, post_id):
+        return post_id in self._docs
+
+    # Maintenance
+
+    def _text(self, post, field):
+        if field == 'content' and self.content is not None:
+            return self.content(post['id']) or ''
+        return _field_text(post, field)
+
+    def _analyze(self, post):
+        """(term -> (weighted tf, positions), length, field ends, lowercased tags) of a post"""
+        terms, ends, position = {}, [], 0
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(self._text(post, field)):
+                tf, positions = terms.get(term, (0, []))
+                positions.append(position)
+                terms[term] = (tf + weight, positions)
+                position += 1
+            ends.append(position)
+            # Keep phrases from running on from one field into the next
+            position += 1
+        length = sum(tf for tf, _ in terms.values())
+        return terms, length, tuple(ends), {tag.lower() for tag in post.get('tags', ())}
+
+    def add(self, post):
+        """Index a post, replacing any previous version of it"""
+        self.add_many([post])
+
+    def add_many(self, posts):
+        """Index a batch of posts, tokenizing before the lock is taken"""
+        analyzed = [(post, self._analyze(post)) for post in posts]
+        with self._lock:
+            for post, (terms, length, ends, tags) in analyzed:
+                post_id = post['id']
+                self._remove(post_id)
+                shortest = _shortest(length)
+                for term, (tf, positions) in terms.items():
+                    self._postings.setdefault(term, {})[post_id] = (
+                        positions[0] if len(positions) == 1 else tuple(positions))
+                    buckets = self._impacts.setdefault(term, {})
+                    buckets.setdefault((tf, shortest), []).append(post_id)
+                for tag in tags:
+                    self._tags.setdefault(tag, set()).add(post_id)
+                self._doc_terms[post_id] = (tuple(terms), tuple(tags))
+                self._doc_lengths[post_id] = length
+                self._field_ends[post_id] = ends
+                self._docs[post_id] = post
+                self._total_length += length
+            self._generation += 1
+
+    def remove(self, post_id):
+        with self._lock:
+            self._remove(post_id)
+
+    def _remove(self, post_id):
+        entry = self._doc_terms.pop(post_id, None)
+        if entry is None:
+            return
+        self._generation += 1
+        terms, tags = entry
+        for term in terms:
+            postings = self._postings[term]
+            del postings[post_id]
+            if not postings:
+                del self._postings[term]
+                del self._impacts[term]
+                self._stale.pop(term, None)
+                continue
+            stale = self._stale[term] = self._stale.get(term, 0) + 1
+            if stale > len(postings):
+                self._rebuild_impacts(term)
+        for tag in tags:
+            bucket = self._tags[tag]
+            bucket.discard(post_id)
+            if not bucket:
+                del self._tags[tag]
+        self._total_length -= self._doc_lengths.pop(post_id)
+        del self._field_ends[post_id]
+        del self._docs[post_id]
+
+    def _rebuild_impacts(self, term):
+        """Regroup a term's postings into buckets, dropping stale entries"""
+        buckets = {}
+        for post_id, posting in self._postings[term].items():
+            key = (_weighted_tf(posting, self._field_ends[post_id]), _shortest(self._doc_lengths[post_id]))
+            buckets.setdefault(key, []).append(post_id)
+        self._impacts[term] = buckets
+        del self._stale[term]
+
+    # Queries
+
+    def _candidates(self, terms, tags):
+        """Ids of posts that contain every term and carry every tag
+
+        A single term or tag returns its postings or tag set itself, which
+        must not be changed.
+        """
+        sets = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                return set()
+            sets.append(postings)
+        for tag in tags:
+            bucket = self._tags.get(tag)
+            if not bucket:
+                return set()
+            sets.append(bucket)
+        if not sets:
+            return set()
+        # Intersect starting from the rarest list to keep the work small
+        sets.sort(key=len)
+        candidates = sets[0]
+        for other in sets[1:]:
+            candidates = {post_id for post_id in candidates if post_id in other}
+            if not candidates:
+                break
+        return candidates
+
+    def _with_phrase(self, candidates, phrase):
+        """The candidates in which the phrase's terms follow one another"""
+        if not candidates:
+            # A term with no postings leaves no candidates and nothing to look up
+            return set()
+        first = self._postings[phrase[0]]
+        rest = [(offset, self._postings[term]) for offset, term in enumerate(phrase[1:], 1)]
+        found = set()
+        for post_id in candidates:
+            for start in _positions(first[post_id]):
+                for offset, postings in rest:
+                    posting = postings[post_id]
+                    if not (posting == start + offset if type(posting) is int else start + offset in posting):
+                        break
+                else:
+                    found.add(post_id)
+                    break
+        return found
+
+    def _top(self, candidates, terms, k):
+        """The k best (bm25 score, post_id) pairs among the candidates, best first"""
+        if not candidates or k <= 0:
+            return []
+        if not terms:
+            return heapq.nlargest(k, ((0.0, post_id) for post_id in candidates))
+        doc_count = len(self._docs)
+        avg_length = (self._total_length / doc_count) if doc_count else 1.0
+        k1, b = self.k1, self.b
+        base = k1 * (1 - b)
+        slope = k1 * b / avg_length
+        lengths, all_ends = self._doc_lengths, self._field_ends
+
+        lists = []
+        for term in terms:
+            postings = self._postings[term]
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            boost = idf * (k1 + 1)
+            buckets = sorted(
+                ((boost * tf / (tf + base + slope * shortest), post_ids)
+                 for (tf, shortest), post_ids in self._impacts[term].items()),
+                key=lambda bucket: bucket[0], reverse=True)
+            lists.append((postings, boost, buckets))
+
+        def score(post_id):
+            length, ends, total = lengths[post_id], all_ends[post_id], 0.0
+            for postings, boost, _ in lists:
+                tf = _weighted_tf(postings[post_id], ends)
+                total += boost * tf / (tf + base + slope * length)
+            return total
+
+        cursors = [0] * len(lists)
+        top, seen = [], set()
+        while True:
+            if any(cursor == len(buckets) for cursor, (_, _, buckets) in zip(cursors, lists)):
+                # Every post containing all the terms has been seen
+                break
+            ahead = [buckets[cursor][0] for cursor, (_, _, buckets) in zip(cursors, lists)]
+            if len(top) == k and top[0][0] > sum(ahead):
+                break
+            i = max(range(len(lists)), key=ahead.__getitem__)
+            post_ids = lists[i][2][cursors[i]][1]
+            cursors[i] += 1
+            for post_id in post_ids:
+                # Removed posts are no candidates; re-added ones may be listed twice
+                if post_id not in candidates or post_id in seen:
+                    continue
+                seen.add(post_id)
+                entry = (score(post_id), post_id)
+                if len(top) < k:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+        return sorted(top, reverse=True)
+
+    def search(self, query, tags=None, page=1, per_page=10):
+        """Run a query and return one page of ranked results
+
+        Returns a dict with 'total' (number of matching posts) and 'results',
+        a list of (post, score) pairs best first.
+        """
+        terms, phrases, query_tags = parse_query(query)
+        tags = sorted(set(query_tags + [t.lower() for t in tags or ()]))
+        terms = list(dict.fromkeys(terms + [t for p in phrases for t in p]))
+        page = max(page, 1)
+        key = (tuple(terms), tuple(map(tuple, phrases)), tuple(tags), page, per_page)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == self._generation:
+                self._cache.move_to_end(key)
+                return cached[1]
+
+            candidates = self._candidates(terms, tags)
+            for phrase in phrases:
+                candidates = self._with_phrase(candidates, phrase)
+            top = self._top(candidates, terms, page * per_page)
+            found = {
+                'total': len(candidates),
+                'results': [(self._docs[pid], score) for score, pid in top[(page - 1) * per_page:]],
+            }
+
+            self._cache[key] = (self._generation, found)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
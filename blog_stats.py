@@ -0,0 +1,70 @@
+import heapq
+import threading
+
+
+class BlogStats:
+    """Site-wide totals and tag popularity, maintained as writes happen
+
+    The sidebar used to recompute these from every post on each page view;
+    here each write adjusts a counter and reads are O(1) (top tags is a
+    heap selection over distinct tags, cached until a tag count changes).
+    """
+
+    def __init__(self, user_count=0):
+        self.post_count = 0
+        self.comment_count = 0
+        self.user_count = user_count
+        self.tag_counts = {}
+        self._top_tags = {}
+        self._lock = threading.RLock()
+
+    def _count_tags(self, tags, delta):
+        for tag in tags:
+            count = self.tag_counts.get(tag, 0) + delta
+            if count > 0:
+                self.tag_counts[tag] = count
+            else:
+                self.tag_counts.pop(tag, None)
+        if tags:
+            self._top_tags.clear()
+
+    def add_user(self):
+        with self._lock:
+            self.user_count += 1
+
+    def _count_post(self, delta, tags):
+        """Count a published post (and its tags) in or out"""
+        self.post_count += delta
+        self._count_tags(tags or [], delta)
+
+    def on_store_event(self, event, post, **extra):
+        """PostStore listener keeping the totals in step with writes
+
+        Posts and tags count only while published; comments always count.
+        """
+        with self._lock:
+            if event == 'posts_added':
+                for added in extra['posts']:
+                    self.on_store_event('post_added', added)
+            elif event == 'post_added':
+                self.comment_count += post['comment_count']
+                if post['status'] == 'published':
+                    self._count_post(1, post['tags'])
+            elif event == 'comment_added':
+                self.comment_count += 1
+            elif event == 'post_updated':
+                previous = extra.get('previous', {})
+                if 'status' in previous or 'tags' in previous:
+                    if previous.get('status', post['status']) == 'published':
+                        self._count_post(-1, previous.get('tags', post['tags']))
+                    if post['status'] == 'published':
+                        self._count_post(1, post['tags'])
+
+    def top_tags(self, k=10):
+        """The k most used tags as (tag, count), most used first"""
+        with self._lock:
+            top = self._top_tags.get(k)
+            if top is None:
+                top = heapq.nsmallest(k, self.tag_counts.items(), key=lambda item: (-item[1], item[0]))
+                self._top_tags[k] = top
+            return top
@@ -0,0 +1,327 @@
+import contextlib
+import gc
+import json
+import os
+import pickle
+import threading
+
+SNAPSHOT_NAME = 'snapshot.pickle'
+SEGMENT_PREFIX = 'log.'
+SEGMENT_SUFFIX = '.jsonl'
+
+
+def _segment_name(number):
+    return f'{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}'
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def bulk_load():
+    """Pause the cyclic GC while rebuilding state, then freeze what was loaded
+
+    Loading creates millions of long-lived dicts; without this the collector
+    repeatedly rescans them during startup and on every later full pass.
+    The GC is process-wide, so this is for startup only, before any request
+    threads run.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.freeze()
+        if was_enabled:
+            gc.enable()
+
+
+class EventLogFailed(Exception):
+    """The writer could not write or fsync the log; nothing after the failure is durable"""
+
+
+def post_event_record(event, post, **extra):
+    """Turn a PostStore journal call into a log record"""
+    if event == 'post_added':
+        return {'op': event, 'post': post, 'comments': extra['comments']}
+    if event == 'posts_added':
+        return {'op': event, 'posts': extra['posts'], 'comments': extra['comments']}
+    if event == 'comment_added':
+        return {'op': event, 'post_id': post['id'], 'comment': extra['comment']}
+    if event == 'post_updated':
+        return {'op': event, 'post_id': post['id'],
+                'fields': {name: post[name] for name in extra['fields']}}
+    if event == 'views_added':
+        return {'op': event, 'post_id': post['id'], 'count': extra['count']}
+    if event in ('post_liked', 'post_unliked'):
+        return {'op': event, 'post_id': post['id'], 'user_id': extra['user_id']}
+    raise ValueError(f'Unknown post event: {event}')
+
+
+def record_weight(record):
+    """Number of writes a log record stands for (batch records hold many)"""
+    return len(record['posts']) if record.get('op') == 'posts_added' else 1
+
+
+class EventLog:
+    """Append-only, fsync-batched mutation log with periodic snapshots
+
+    Records are JSON lines written to numbered segment files.  append() only
+    encodes and queues the record; a writer thread writes whatever has queued
+    up and fsyncs once per batch (group commit), and sync() waits until
+    everything appended so far is on disk.
+
+    A snapshot is a pickled copy of the whole state plus the number of the
+    first segment it does not cover, followed by any number of separately
+    pickled blobs that are written and read back one at a time.  rotate()
+    must be called atomically with capturing that state (see snapshot()),
+    after which older segments are deleted.  Startup reads the snapshot and
+    replays the segments after it; a torn final line left by a crash is
+    ignored.
+
+    If a write or fsync fails (a full or failing disk) the writer stops and
+    keeps the error; sync() then raises EventLogFailed instead of waiting
+    for records that will never be durable.
+    """
+
+    def __init__(self, directory, snapshot_every=50000):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.snapshot_source = None
+        self.appended = 0
+        self.durable = 0
+        self.snapshots = 0
+        self.failure = None
+        self._records_since_snapshot = 0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._segment = None
+        self._next_segment = None
+        self._file = None
+        self._closed = False
+        self._writer = None
+        self._snapshotting = False
+        self._blobs_offset = None
+
+    # Startup
+
+    def _segments(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def load(self):
+        """Read the snapshot and log; returns (state or None, list of records)
+
+        Must be called once before the first append().  Writing continues in
+        a fresh segment so a torn tail from a crash is never appended to.
+        The snapshot's blobs are left on disk for snapshot_blobs().
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        state, first_segment = None, 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_NAME)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+                if snapshot.get('blobs'):
+                    self._blobs_offset = f.tell()
+            state, first_segment = snapshot['state'], snapshot['segment']
+
+        records = []
+        segments = self._segments()
+        for number in segments:
+            path = os.path.join(self.directory, _segment_name(number))
+            if number < first_segment or os.path.getsize(path) == 0:
+                # Left behind by an interrupted snapshot or an idle run
+                os.remove(path)
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Anything after the last newline is a torn write from a crash
+            lines = data[:data.rfind(b'\n') + 1].splitlines()
+            del data
+            # Decoding a few thousand lines as one JSON array is much faster
+            # than one loads() per line
+            for i in range(0, len(lines), 4096):
+                records.extend(json.loads(b'[' + b','.join(lines[i:i + 4096]) + b']'))
+
+        self._records_since_snapshot = sum(map(record_weight, records))
+        self._next_segment = max(segments + [first_segment - 1]) + 1
+        self._open_segment(self._next_segment)
+        self._writer = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._writer.start()
+        return state, records
+
+    def snapshot_blobs(self):
+        """Yield the (key, value) blobs of the snapshot read by load(), one at a time
+
+        Call before the first snapshot is taken, which replaces the file.
+        """
+        if self._blobs_offset is None:
+            return
+        with open(os.path.join(self.directory, SNAPSHOT_NAME), 'rb') as f:
+            f.seek(self._blobs_offset)
+            while True:
+                key = pickle.load(f)
+                if key is None:
+                    return
+                yield key, pickle.load(f)
+
+    def _open_segment(self, number):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        self._segment = number
+        self._file = open(os.path.join(self.directory, _segment_name(number)), 'ab')
+        _fsync_dir(self.directory)
+
+    # Writing
+
+    def append(self, record, weight=1):
+        """Queue a record; returns its sequence number (see sync())
+
+        weight is how many writes the record stands for when deciding that
+        a snapshot is due, so one batch record counts as its whole batch.
+        """
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Event log is closed')
+            self._queue.append(line)
+            self.appended += 1
+            self._records_since_snapshot += weight
+            sequence = self.appended
+            self._cond.notify_all()
+            snapshot_due = (self.snapshot_source is not None and not self._snapshotting
+                            and self._records_since_snapshot >= self.snapshot_every)
+            if snapshot_due:
+                self._snapshotting = True
+        if snapshot_due:
+            threading.Thread(target=self._background_snapshot, name='event-log-snapshot', daemon=True).start()
+        return sequence
+
+    def record_post_event(self, event, post, **extra):
+        """PostStore journal: log every post mutation in apply order"""
+        record = post_event_record(event, post, **extra)
+        self.append(record, record_weight(record))
+
+    def sync(self, sequence=None):
+        """Block until the given record (default: everything so far) is durable
+
+        Raises EventLogFailed if the writer failed before getting there.
+        """
+        with self._cond:
+            target = self.appended if sequence is None else sequence
+            while self.durable < target and not self._closed and self.failure is None:
+                self._cond.wait()
+            if self.durable < target and self.failure is not None:
+                raise EventLogFailed(f'Event log write failed: {self.failure}') from self.failure
+
+    def rotate(self):
+        """Start a new segment; records appended from now on go into it
+
+        Returns the new segment number.  The switch is queued behind records
+        already appended, so it lands exactly between them and later ones.
+        """
+        with self._cond:
+            self._queue.append(None)
+            self._next_segment += 1
+            self._records_since_snapshot = 0
+            self._cond.notify_all()
+            return self._next_segment
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue and self._closed:
+                    return
+                batch, self._queue = self._queue, []
+            written = 0
+            try:
+                for item in batch:
+                    if item is None:
+                        self._open_segment(self._segment + 1)
+                    else:
+                        self._file.write(item)
+                        written += 1
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                # Whether any of the batch reached the disk is unknown, so
+                # nothing more is written or reported durable
+                with self._cond:
+                    self.failure = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self.durable += written
+                self._cond.notify_all()
+
+    # Snapshots
+
+    def snapshot(self, capture):
+        """Write a snapshot of what capture(rotate) returns
+
+        capture(rotate) must call rotate() and take the state while holding
+        whatever lock orders appends, so the state covers exactly the
+        segments before the one rotate() returns.  It returns (segment,
+        state, blobs): blobs yields (key, pickled value) pairs, keys never
+        None, and is only iterated after capture() returns, so large values
+        can be pickled or copied without holding that lock.
+        """
+        segment, state, blobs = capture(self.rotate)
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'segment': segment, 'state': state, 'blobs': True}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for key, data in blobs:
+                pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(data)
+            pickle.dump(None, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(self.directory)
+        # The writer must have moved on before older segments may go
+        with self._cond:
+            while self._segment < segment and not self._closed and self.failure is None:
+                self._cond.wait()
+            if self._segment < segment:
+                return
+        for number in self._segments():
+            if number < segment:
+                os.remove(os.path.join(self.directory, _segment_name(number)))
+        self.snapshots += 1
+
+    def _background_snapshot(self):
+        try:
+            self.snapshot(self.snapshot_source)
+        finally:
+            with self._cond:
+                self._snapshotting = False
+
+    def close(self):
+        """Write out everything queued and stop the writer thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join()
+        if self._file is not None:
+            if self.failure is None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
@@ -0,0 +1,477 @@
+import base64
+import binascii
+import bisect
+import threading
+from array import array
+
+from blog_bodies import BodyStore
+
+
+# Lifecycle of a post; only published posts are listed, searched or counted
+POST_STATUSES = ('draft', 'scheduled', 'published')
+
+
+def encode_cursor(key):
+    """Turn a (created_at, id) sort key into an opaque cursor string"""
+    raw = '\x1f'.join(key).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    parts = raw.split('\x1f')
+    if len(parts) != 2:
+        raise ValueError('Invalid cursor')
+    return tuple(parts)
+
+
+class CommentStore:
+    """Comments kept apart from their posts, one append-only list per post
+
+    The lists live in a BodyStore next to the post content, so comments of
+    cold posts can be paged out with it.  Comment cursors encode a position
+    in the post's list (plus the id found there, as a check), so any page is
+    a slice and costs O(page size).
+    """
+
+    def __init__(self, bodies):
+        self._bodies = bodies
+
+    def add(self, post_id, comment):
+        self._bodies.add_comment(post_id, comment)
+
+    def all(self, post_id, promote=True):
+        return list(self._bodies.comments(post_id, promote))
+
+    def page(self, post_id, limit, cursor=None):
+        """Oldest-first page of comments after the cursor; (comments, next_cursor)"""
+        comments = self._bodies.comments(post_id)
+        start = 0
+        if cursor is not None:
+            position, comment_id = decode_cursor(cursor)
+            if not position.isdigit():
+                raise ValueError('Invalid cursor')
+            start = int(position)
+            if not 0 < start <= len(comments) or comments[start - 1]['id'] != comment_id:
+                raise ValueError('Invalid cursor')
+        page = comments[start:start + limit]
+        end = start + len(page)
+        next_cursor = encode_cursor((str(end), page[-1]['id'])) if page and end < len(comments) else None
+        return page, next_cursor
+
+
+class LikeSets:
+    """Who liked each post, as sorted arrays of user numbers
+
+    Users are identified by their small integer number (see
+    UserDirectory.number), so a like costs 4 bytes instead of a set entry
+    holding a string id.  Membership is a bisect; adding or removing moves
+    at most the tail of one post's array.
+    """
+
+    def __init__(self):
+        self._sets = {}
+
+    def contains(self, post_id, member):
+        members = self._sets.get(post_id)
+        if not members:
+            return False
+        i = bisect.bisect_left(members, member)
+        return i < len(members) and members[i] == member
+
+    def add(self, post_id, member):
+        """Add a member; returns False if it was already there"""
+        members = self._sets.get(post_id)
+        if members is None:
+            members = self._sets[post_id] = array('I')
+        i = bisect.bisect_left(members, member)
+        if i < len(members) and members[i] == member:
+            return False
+        members.insert(i, member)
+        return True
+
+    def remove(self, post_id, member):
+        """Remove a member; returns False if it was not there"""
+        members = self._sets.get(post_id)
+        if not members:
+            return False
+        i = bisect.bisect_left(members, member)
+        if i == len(members) or members[i] != member:
+            return False
+        del members[i]
+        if not members:
+            del self._sets[post_id]
+        return True
+
+    def members(self, post_id):
+        return list(self._sets.get(post_id, ()))
+
+    def load(self, post_id, members):
+        self._sets[post_id] = array('I', sorted(set(members)))
+
+    def post_ids(self):
+        return list(self._sets)
+
+
+class PostStore:
+    """In-memory post repository with a primary id index and sorted key indexes
+
+    Posts are plain dicts (the same shape the routes and the API have always
+    used), except that the content and comments live in a BodyStore, which
+    may page them out to disk; the post only carries comment_count, and
+    content() or with_content() read the body back.
+
+    Sorted lists of (created_at, id) keys, one over all posts, one per
+    status and one per tag and per author over published posts, back
+    newest-first keyset paging, so listing a slice never scans the whole
+    store.
+
+    Derived structures (search, caches, stats) register a listener with
+    subscribe(); it is called as listener(event, post, **extra) after every
+    write, with event one of 'post_added', 'post_updated', 'comment_added',
+    'views_added', 'post_liked' or 'post_unliked'.  Updates pass fields (the
+    changed names) and previous (their old values); likes pass user_id.
+    add_many() sends a single 'posts_added' event for the whole batch, with
+    post None and the batch in posts.  Listeners get the stored posts,
+    without content.
+
+    The journal, if set, has the same signature but is called while the
+    write lock is still held, so the order it sees is exactly the order the
+    writes were applied in; added posts, and updates that change the
+    content, reach it with their content.  Holding `lock` gives a
+    consistent view.
+    """
+
+    def __init__(self, posts=None, bodies=None):
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_status = {}
+        self._by_created = []
+        self._published_by_tag = {}
+        self._published_by_author = {}
+        self._bodies = bodies if bodies is not None else BodyStore()
+        self._comments = CommentStore(self._bodies)
+        self._likes = LikeSets()
+        self._listeners = []
+        self.journal = None
+        for post in posts or []:
+            self.add(post)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __contains__(self, post_id):
+        return post_id in self._by_id
+
+    def subscribe(self, listener):
+        """Register a callable notified after every write"""
+        self._listeners.append(listener)
+        return listener
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def _notify(self, event, post, **extra):
+        for listener in self._listeners:
+            listener(event, post, **extra)
+
+    # Index helpers
+
+    @staticmethod
+    def _sort_key(post):
+        return (post['created_at'], post['id'])
+
+    def _index_post(self, post):
+        key = self._sort_key(post)
+        bisect.insort(self._by_created, key)
+        bisect.insort(self._by_status.setdefault(post['status'], []), key)
+        if post['status'] == 'published':
+            bisect.insort(self._published_by_author.setdefault(post['author_id'], []), key)
+            for tag in post['tags']:
+                bisect.insort(self._published_by_tag.setdefault(tag, []), key)
+
+    @staticmethod
+    def _merge_keys(existing, keys):
+        """Merge already sorted keys into a sorted key list in one pass
+
+        Each key is placed with a bisect and the runs between them are
+        copied as slices, so a batch costs one copy of the list rather
+        than an insort (a memmove of the tail) per key or a full re-sort.
+        Returns the merged list, which may be existing itself.
+        """
+        if not existing or not keys or keys[0] >= existing[-1]:
+            existing.extend(keys)
+            return existing
+        merged, start = [], 0
+        for key in keys:
+            end = bisect.bisect_left(existing, key, start)
+            merged.extend(existing[start:end])
+            merged.append(key)
+            start = end
+        merged.extend(existing[start:])
+        return merged
+
+    @staticmethod
+    def _remove_key(keys, key):
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    @classmethod
+    def _remove_indexed_key(cls, index, name, key):
+        keys = index.get(name)
+        if keys is not None:
+            cls._remove_key(keys, key)
+            if not keys:
+                del index[name]
+
+    def _unindex_post(self, post):
+        key = self._sort_key(post)
+        self._remove_key(self._by_created, key)
+        self._remove_indexed_key(self._by_status, post['status'], key)
+        if post['status'] == 'published':
+            self._remove_indexed_key(self._published_by_author, post['author_id'], key)
+            for tag in post['tags']:
+                self._remove_indexed_key(self._published_by_tag, tag, key)
+
+    # Reads
+
+    def get(self, post_id):
+        """Return the post with the given id, or None"""
+        return self._by_id.get(post_id)
+
+    def all(self):
+        """All posts in insertion order"""
+        with self._lock:
+            return list(self._by_id.values())
+
+    def count(self, status=None):
+        """Number of posts, or of posts with the given status"""
+        with self._lock:
+            if status is None:
+                return len(self._by_id)
+            return len(self._by_status.get(status, ()))
+
+    def content(self, post_id, promote=True):
+        """The content of a post, read back from disk if it was paged out
+
+        promote=False leaves a paged-out body on disk, for scans such as
+        exports.
+        """
+        return self._bodies.content(post_id, promote)
+
+    def with_content(self, post, promote=True):
+        """Copy of a stored post with its content filled in"""
+        return dict(post, content=self._bodies.content(post['id'], promote))
+
+    def snapshot_bodies(self, posts):
+        """(post id, pickled (content, comments)) for each post, pickled lazily
+
+        Call with the lock held, so the bodies match the posts being copied;
+        iterate after releasing it (see BodyStore.snapshot).
+        """
+        return self._bodies.snapshot([post['id'] for post in posts])
+
+    def comments(self, post_id, promote=True):
+        """All comments of a post, oldest first"""
+        with self._lock:
+            return self._comments.all(post_id, promote)
+
+    def comments_page(self, post_id, limit, cursor=None):
+        """Oldest-first page of a post's comments; raises ValueError for a bad cursor"""
+        with self._lock:
+            return self._comments.page(post_id, limit, cursor)
+
+    def liked(self, post_id, member):
+        """True if the user with this number likes the post"""
+        with self._lock:
+            return self._likes.contains(post_id, member)
+
+    def likes(self):
+        """{post id: [user numbers]} for every post with likes"""
+        with self._lock:
+            return {post_id: self._likes.members(post_id) for post_id in self._likes.post_ids()}
+
+    def page(self, limit, cursor=None, status=None, tag=None, author_id=None):
+        """Newest-first page of posts older than the cursor
+
+        With a status, only posts in that status are listed, read straight
+        from its index.  A tag or author_id lists just that tag's or
+        author's published posts (the only ones indexed that way), so it
+        needs status='published'.  Returns (posts, next_cursor);
+        next_cursor is None on the last page.  Only the requested slice is
+        touched, whatever the store size.
+        """
+        if (tag is not None or author_id is not None) and status != 'published':
+            raise ValueError('Posts are only indexed by tag and author once published')
+        with self._lock:
+            if tag is not None:
+                index = self._published_by_tag.get(tag, [])
+            elif author_id is not None:
+                index = self._published_by_author.get(author_id, [])
+            else:
+                index = self._by_created if status is None else self._by_status.get(status, [])
+            end = len(index)
+            if cursor is not None:
+                end = bisect.bisect_left(index, decode_cursor(cursor))
+            start = max(end - limit, 0)
+            keys = index[start:end]
+            page = [self._by_id[post_id] for _, post_id in reversed(keys)]
+        next_cursor = encode_cursor(keys[0]) if start > 0 else None
+        return page, next_cursor
+
+    # Writes
+
+    def add(self, post, comments=None):
+        """Insert a new post; raises ValueError if the id is already taken
+
+        Comments may be passed separately or, for data in the older shape,
+        as a 'comments' list on the post; either way they are moved into
+        the comment store.  The content is moved to the body store too.
+        """
+        legacy_comments = post.pop('comments', None)
+        comments = list(comments if comments is not None else legacy_comments or [])
+        post['comment_count'] = len(comments)
+        with self._lock:
+            if post['id'] in self._by_id:
+                raise ValueError(f"Post {post['id']} already exists")
+            content = post.pop('content', '')
+            self._by_id[post['id']] = post
+            self._bodies.put(post['id'], content, comments)
+            self._index_post(post)
+            if self.journal:
+                self.journal('post_added', dict(post, content=content), comments=comments)
+        self._notify('post_added', post, comments=comments)
+        return post
+
+    def add_many(self, batch):
+        """Insert a batch of (post, comments) pairs as one write
+
+        Either every post goes in or, if any id is taken or repeated, none
+        does (ValueError).  Listeners and the journal see one 'posts_added'
+        event, so derived state is updated once per batch.
+        """
+        added, comments_by_id = [], {}
+        for post, comments in batch:
+            legacy_comments = post.pop('comments', None)
+            comments = list(comments if comments is not None else legacy_comments or [])
+            post['comment_count'] = len(comments)
+            added.append(post)
+            if comments:
+                comments_by_id[post['id']] = comments
+        with self._lock:
+            ids = {post['id'] for post in added}
+            if len(ids) < len(added) or any(post_id in self._by_id for post_id in ids):
+                raise ValueError('Batch repeats a post id or reuses an existing one')
+            keys = sorted(self._sort_key(post) for post in added)
+            status_keys = {}
+            contents = []
+            for post in added:
+                contents.append(post.pop('content', ''))
+                self._by_id[post['id']] = post
+                self._bodies.put(post['id'], contents[-1], comments_by_id.get(post['id'], ()))
+            tag_keys, author_keys = {}, {}
+            for key in keys:
+                post = self._by_id[key[1]]
+                status_keys.setdefault(post['status'], []).append(key)
+                if post['status'] == 'published':
+                    author_keys.setdefault(post['author_id'], []).append(key)
+                    for tag in post['tags']:
+                        tag_keys.setdefault(tag, []).append(key)
+            self._by_created = self._merge_keys(self._by_created, keys)
+            for status, batch_keys in status_keys.items():
+                self._by_status[status] = self._merge_keys(self._by_status.get(status, []), batch_keys)
+            for index, grouped in ((self._published_by_tag, tag_keys), (self._published_by_author, author_keys)):
+                for name, batch_keys in grouped.items():
+                    index[name] = self._merge_keys(index.get(name, []), batch_keys)
+            if self.journal:
+                self.journal('posts_added', None, posts=[dict(post, content=content) for post, content in
+                                                         zip(added, contents)], comments=comments_by_id)
+        self._notify('posts_added', None, posts=added, comments=comments_by_id)
+        return added
+
+    def update(self, post_id, **fields):
+        """Change fields of a post, keeping the secondary indexes in sync"""
+        with self._lock:
+            post = self._by_id.get(post_id)
+            if post is None:
+                return None
+            previous = {name: post.get(name) for name in fields if name != 'content'}
+            if 'content' in fields:
+                previous['content'] = self._bodies.content(post_id, promote=False)
+                self._bodies.set_content(post_id, fields['content'])
+            self._unindex_post(post)
+            if 'tags' in fields:
+                fields['tags'] = list(fields['tags'])
+            post.update((name, value) for name, value in fields.items() if name != 'content')
+            self._index_post(post)
+            if self.journal:
+                logged = dict(post, content=fields['content']) if 'content' in fields else post
+                self.journal('post_updated', logged, fields=tuple(fields), previous=previous)
+        self._notify('post_updated', post, fields=tuple(fields), previous=previous)
+        return post
+
+    def add_comment(self, post_id, comment):
+        """Append a comment to a post and return the post (None if missing)"""
+        with self._lock:
+            post = self._by_id.get(post_id)
+            if post is None:
+                return None
+            self._comments.add(post_id, comment)
+            post['comment_count'] += 1
+            post['updated_at'] = comment['created_at']
+            if self.journal:
+                self.journal('comment_added', post, comment=comment)
+        self._notify('comment_added', post, comment=comment)
+        return post
+
+    def set_liked(self, post_id, user_id, member, liked=True):
+        """Like (or unlike) a post once per user; returns (post, changed)
+
+        member is the user's number, which the compact like sets hold;
+        user_id is what the journal records.  post is None if missing.
+        """
+        with self._lock:
+            post = self._by_id.get(post_id)
+            if post is None:
+                return None, False
+            if liked:
+                changed = self._likes.add(post_id, member)
+            else:
+                changed = self._likes.remove(post_id, member)
+            if not changed:
+                return post, False
+            event = 'post_liked' if liked else 'post_unliked'
+            post['likes'] = max(post['likes'] + (1 if liked else -1), 0)
+            if self.journal:
+                self.journal(event, post, user_id=user_id)
+        self._notify(event, post, user_id=user_id)
+        return post, True
+
+    def load_likes(self, post_id, members):
+        """Restore a post's like set from a snapshot, leaving its count alone"""
+        with self._lock:
+            if post_id in self._by_id:
+                self._likes.load(post_id, members)
+
+    def add_views(self, increments):
+        """Apply a batch of {post_id: views} increments from the view counter"""
+        applied = []
+        with self._lock:
+            for post_id, count in increments.items():
+                post = self._by_id.get(post_id)
+                if post is not None:
+                    post['views'] += count
+                    applied.append((post, count))
+                    if self.journal:
+                        self.journal('views_added', post, count=count)
+        for post, count in applied:
+            self._notify('views_added', post, count=count)
@@ -0,0 +1,159 @@
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+
+# Activity weights; a post's score is the decayed sum of its weighted events
+POST_WEIGHT = 10.0
+VIEW_WEIGHT = 1.0
+LIKE_WEIGHT = 3.0
+COMMENT_WEIGHT = 5.0
+
+# Rebase stored values before exp() gets anywhere near overflowing
+MAX_EXPONENT = 500.0
+
+
+def _timestamp(value, default):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return default
+
+
+class TrendingRanking:
+    """Posts ranked by activity with exponential time decay
+
+    An event of weight w at time t is worth w * 2 ** -((now - t) / half_life).
+    Since every score decays at the same rate, each post only stores
+    sum(w * exp(rate * (t - epoch))): the order never changes by itself, so
+    an event touches just its own post.  The heap holds (-value, id) with
+    lazy deletion: an update pushes a new entry and leaves the old one to be
+    discarded when it surfaces, and the heap is compacted once stale
+    entries outnumber live ones.  top(n) pops n live entries and pushes
+    them back, O((n + stale) log size) without sorting the posts.
+    """
+
+    def __init__(self, half_life=24 * 3600.0):
+        self.half_life = half_life
+        self._rate = math.log(2) / half_life
+        self._epoch = time.time()
+        self._values = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def _weight(self, amount, at):
+        exponent = self._rate * (at - self._epoch)
+        if exponent > MAX_EXPONENT:
+            self._rebase(at)
+            exponent = self._rate * (at - self._epoch)
+        return amount * math.exp(max(exponent, -MAX_EXPONENT))
+
+    def _decay(self, now):
+        """Factor turning stored values into scores at `now`"""
+        # Only a clock stepping backwards can put now before the epoch
+        return math.exp(min(-self._rate * (now - self._epoch), MAX_EXPONENT))
+
+    def _rebase(self, now):
+        """Move the epoch to now, scaling every value by the same factor"""
+        factor = math.exp(-self._rate * (now - self._epoch))
+        self._epoch = now
+        self._values = {post_id: value * factor for post_id, value in self._values.items()}
+        self._compact()
+
+    def _compact(self):
+        self._heap = [(-value, post_id) for post_id, value in self._values.items()]
+        heapq.heapify(self._heap)
+
+    def _set(self, post_id, value):
+        self._values[post_id] = value
+        heapq.heappush(self._heap, (-value, post_id))
+        if len(self._heap) > 2 * len(self._values) + 1024:
+            self._compact()
+
+    def add(self, post_id, amount, at=None):
+        """Record activity of the given weight (negative to take some back)"""
+        now = time.time()
+        # Activity dated in the future would drag the epoch along with it
+        at = now if at is None else min(at, now)
+        with self._lock:
+            if post_id not in self._values:
+                return
+            # _weight may rebase, so read the stored value only after it
+            weight = self._weight(amount, at)
+            self._set(post_id, max(self._values[post_id] + weight, 0.0))
+
+    def seed(self, post):
+        """Start (or restart) a post's score from its current totals
+
+        Creation counts at created_at and existing activity at updated_at,
+        the best guess available for posts loaded from storage or imports.
+        Timestamps in the future (clock skew, bad imports) count as now.
+        """
+        now = time.time()
+        created = min(_timestamp(post.get('created_at'), now), now)
+        updated = min(_timestamp(post.get('updated_at'), created), now)
+        activity = (post.get('views', 0) * VIEW_WEIGHT + post.get('likes', 0) * LIKE_WEIGHT
+                    + post.get('comment_count', 0) * COMMENT_WEIGHT)
+        with self._lock:
+            self._set(post['id'], self._weight(POST_WEIGHT, created) + self._weight(activity, updated))
+
+    def remove(self, post_id):
+        """Take a post out of the ranking (its heap entries go stale)"""
+        with self._lock:
+            self._values.pop(post_id, None)
+
+    def rebuild(self, posts):
+        """Seed every published post at once, e.g. after loading from storage"""
+        for post in posts:
+            if post['status'] == 'published':
+                self.seed(post)
+        with self._lock:
+            self._compact()
+
+    def score(self, post_id, now=None):
+        """Current decayed score of a post (0.0 if unknown)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._values.get(post_id, 0.0) * self._decay(now)
+
+    def top(self, n):
+        """[(post id, current score)] of the n highest ranked posts"""
+        now = time.time()
+        found = []
+        with self._lock:
+            heap, values = self._heap, self._values
+            while heap and len(found) < n:
+                negative, post_id = heapq.heappop(heap)
+                if values.get(post_id) == -negative and (negative, post_id) not in found:
+                    found.append((negative, post_id))
+            for entry in found:
+                heapq.heappush(heap, entry)
+            decay = self._decay(now)
+        return [(post_id, -negative * decay) for negative, post_id in found]
+
+    def on_store_event(self, event, post, **extra):
+        """PostStore listener turning writes into trending activity"""
+        if event == 'post_added':
+            if post['status'] == 'published':
+                self.seed(post)
+        elif event == 'posts_added':
+            for added in extra['posts']:
+                if added['status'] == 'published':
+                    self.seed(added)
+        elif event == 'post_updated' and 'status' in extra.get('fields', ()):
+            if post['status'] == 'published':
+                self.seed(post)
+            else:
+                self.remove(post['id'])
+        elif event == 'views_added':
+            self.add(post['id'], extra['count'] * VIEW_WEIGHT)
+        elif event == 'comment_added':
+            self.add(post['id'], COMMENT_WEIGHT)
+        elif event == 'post_liked':
+            self.add(post['id'], LIKE_WEIGHT)
+        elif event == 'post_unliked':
+            self.add(post['id'], -LIKE_WEIGHT)
@@ -0,0 +1,98 @@
+import threading
+
+
+def normalize(value):
+    """Case-insensitive key used by the username and email indexes"""
+    return value.strip().casefold()
+
+
+class DuplicateUser(ValueError):
+    """Raised by UserDirectory.add when the username or email is taken"""
+
+    def __init__(self, field):
+        super().__init__(f'{field} already exists')
+        self.field = field
+
+
+class UserDirectory:
+    """User accounts indexed by id, username and email
+
+    Usernames and emails are indexed case-insensitively, so lookups for
+    login and duplicate checks for registration are dict hits rather than
+    scans.  add() checks and inserts under one lock, so two concurrent
+    registrations cannot both claim the same name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = []
+        self._numbers = {}
+        self._by_id = {}
+        self._by_username = {}
+        self._by_email = {}
+
+    def __len__(self):
+        return len(self._users)
+
+    def __iter__(self):
+        # Append-only list, so iterating while users register is safe
+        return iter(self._users)
+
+    def get(self, user_id):
+        return self._by_id.get(user_id)
+
+    def number(self, user_id):
+        """Small integer assigned to a user in this process (None if unknown)
+
+        Numbers follow load order, so they are only for in-memory structures
+        such as like sets; anything stored refers to users by id.
+        """
+        return self._numbers.get(user_id)
+
+    def by_number(self, number):
+        return self._users[number]
+
+    def by_username(self, username):
+        return self._by_username.get(normalize(username))
+
+    def by_email(self, email):
+        return self._by_email.get(normalize(email))
+
+    def add(self, user):
+        """Insert a user, raising DuplicateUser if the name or email is taken"""
+        username, email = normalize(user['username']), normalize(user['email'])
+        with self._lock:
+            if user['id'] in self._by_id:
+                raise DuplicateUser('id')
+            if username in self._by_username:
+                raise DuplicateUser('username')
+            if email in self._by_email:
+                raise DuplicateUser('email')
+            self._insert(user, username, email)
+        return user
+
+    def restore(self, user):
+        """Insert a user read back from storage; returns False if already present
+
+        Older data may hold emails differing only in case, so the first
+        account keeps the index entry instead of failing the restore.
+        """
+        with self._lock:
+            if user['id'] in self._by_id:
+                return False
+            self._insert(user, normalize(user['username']), normalize(user['email']))
+        return True
+
+    def _insert(self, user, username, email):
+        self._numbers[user['id']] = len(self._users)
+        self._users.append(user)
+        self._by_id[user['id']] = user
+        self._by_username.setdefault(username, user)
+        self._by_email.setdefault(email, user)
+
+    def set_password_hash(self, user_id, password_hash):
+        with self._lock:
+            user = self._by_id.get(user_id)
+            if user is not None:
+                user['password_hash'] = password_hash
+        return user
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+
+class VersionTracker:
+    """Change counters for collections and single records
+
+    Every write bumps the counter of each key it affects ('posts', 'users',
+    ('post', id), ...) and stamps the time.  ETags are built from these
+    counters, so a conditional GET can be answered without touching the data.
+    Counters restart with the process; the per-process nonce in every ETag
+    keeps values from an earlier run from ever matching.
+    """
+
+    def __init__(self):
+        self.nonce = uuid.uuid4().hex[:8]
+        self.started = datetime.now(timezone.utc).replace(microsecond=0)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *keys):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self._lock:
+            for key in keys:
+                version = self._versions.get(key, (0, None))[0]
+                self._versions[key] = (version + 1, now)
+
+    def get(self, key):
+        """(version, last modified) of a key; unseen keys are at version 0"""
+        return self._versions.get(key, (0, self.started))
+
+    def validators(self, key, variant=''):
+        """(strong ETag, last modified) for the current version of key
+
+        variant distinguishes representations of the same data (query
+        arguments, JSON vs NDJSON) so they never share a validator.
+        """
+        version, last_modified = self.get(key)
+        name = key if isinstance(key, str) else '-'.join(key)
+        if variant:
+            name += '-' + hashlib.sha1(variant.encode()).hexdigest()[:12]
+        return f'{name}-{self.nonce}-{version}', last_modified
+
+    def on_store_event(self, event, post, **extra):
+        """PostStore listener: any post write changes the post and the list"""
+        if event == 'posts_added':
+            # Brand new ids have never been served, so only the list changes
+            self.bump('posts')
+        else:
+            self.bump('posts', ('post', post['id']))
+
+
+def _settled(last_modified):
+    """True once no later write can be stamped with the same (whole) second"""
+    return datetime.now(timezone.utc) - last_modified >= timedelta(seconds=1)
+
+
+def not_modified(request, etag, last_modified):
+    """True if the client's cached copy (If-None-Match / If-Modified-Since) is current
+
+    Last-Modified only has one-second resolution, so If-Modified-Since is
+    ignored while the current second may still see another write.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since is not None and _settled(last_modified):
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    """Attach ETag and Last-Modified and ask caches to revalidate each time
+
+    Last-Modified is left out until its second is over (see not_modified),
+    so a client never holds a date that a later write could share.
+    """
+    response.set_etag(etag)
+    if _settled(last_modified):
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def blog_app(tmp_path_factory):
+    """The app module, imported once with its data in a scratch directory"""
+    os.environ['BLOG_DATA_DIR'] = str(tmp_path_factory.mktemp('blog_data'))
+    os.environ['BLOG_HASH_WORKERS'] = '1'
+    import blog_app
+    return blog_app
+
+
+@pytest.fixture
+def client(blog_app):
+    return blog_app.app.test_client()
+
+
+def log_in(client, user_id, username, role='user'):
+    with client.session_transaction() as session:
+        session.update(user_id=user_id, username=username, role=role)
@@ -0,0 +1,71 @@
+import random
+
+from blog_authors import AuthorStats
+from blog_store import POST_STATUSES, PostStore
+
+
+def recount(store, author_id, k):
+    """The dashboard numbers for an author, counted from every post in the store"""
+    own = [post for post in store.all() if post['author_id'] == author_id]
+    statuses = dict.fromkeys(POST_STATUSES, 0)
+    for post in own:
+        statuses[post['status']] += 1
+    totals = {
+        'posts': len(own),
+        'statuses': statuses,
+        'views': sum(post['views'] for post in own),
+        'likes': sum(post['likes'] for post in own),
+        'comments': sum(post['comment_count'] for post in own),
+    }
+    top = sorted(((post['views'], post['id']) for post in own), reverse=True)[:k]
+    return totals, [post_id for _, post_id in top]
+
+
+def make_post(rng, i):
+    return {
+        'id': str(i), 'title': f'Post {i}', 'content': '', 'tags': [],
+        'author_id': rng.choice('abc'), 'author_name': 'x',
+        'status': rng.choice(POST_STATUSES), 'publish_at': None,
+        'created_at': f'2024-01-01 00:00:{i % 60:02d}', 'updated_at': '2024-01-01 00:00:00',
+        'views': rng.randrange(50), 'likes': 0, 'comment_count': 0,
+    }
+
+
+def test_totals_match_a_recount_after_every_kind_of_write():
+    rng = random.Random(21)
+    store, stats = PostStore(), AuthorStats(k=3)
+    store.subscribe(stats.on_store_event)
+    next_id = 0
+    for step in range(2000):
+        action = rng.random()
+        if action < 0.1 or not len(store):
+            store.add(make_post(rng, next_id))
+            next_id += 1
+        elif action < 0.15:
+            batch = [(make_post(rng, next_id + i), [{'id': 'c', 'content': 'hi'}] * rng.randrange(3))
+                     for i in range(rng.randrange(1, 5))]
+            store.add_many(batch)
+            next_id += len(batch)
+        else:
+            post_id = str(rng.randrange(next_id))
+            if action < 0.35:
+                store.update(post_id, status=rng.choice(POST_STATUSES))
+            elif action < 0.6:
+                store.set_liked(post_id, f'u{step % 7}', step % 7, liked=rng.random() < 0.6)
+            elif action < 0.75:
+                store.add_comment(post_id, {'id': str(step), 'content': 'hi', 'created_at': '2024-01-02 00:00:00'})
+            else:
+                store.add_views({post_id: rng.randrange(1, 20)})
+        if step % 100 == 0:
+            for author_id in 'abc':
+                assert stats.get(author_id) == recount(store, author_id, 3)
+    for author_id in 'abc':
+        assert stats.get(author_id) == recount(store, author_id, 3)
+    assert len(stats) == 3
+
+
+def test_author_without_posts_reads_as_zeros():
+    totals, top = AuthorStats().get('nobody')
+    assert totals == {'posts': 0, 'statuses': dict.fromkeys(POST_STATUSES, 0),
+                      'views': 0, 'likes': 0, 'comments': 0}
+    assert top == []
@@ -0,0 +1,101 @@
+import pickle
+import random
+
+import pytest
+
+import blog_bodies
+from blog_bodies import BodyStore
+
+
+def comment(post_id, n):
+    return {'id': f'{post_id}-{n}', 'content': f'comment {n} on {post_id}', 'author': 'someone'}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BodyStore(str(tmp_path), max_bytes=20000)
+
+
+def fill(store, count=200):
+    expected = {}
+    for i in range(count):
+        content, comments = f'post {i} ' * 50, [comment(i, n) for n in range(i % 4)]
+        store.put(i, content, comments)
+        expected[i] = (content, comments)
+    return expected
+
+
+def test_evicted_bodies_fault_back_in(store):
+    expected = fill(store)
+    stats = store.stats()
+    assert stats['resident_bytes'] <= store.max_bytes
+    assert stats['disk_posts'] > 0 and stats['evictions'] > 0
+
+    for post_id in random.Random(1).sample(list(expected), len(expected)):
+        content, comments = expected[post_id]
+        assert store.content(post_id) == content
+        assert store.comments(post_id) == comments
+    assert store.stats()['faults'] > 0
+    assert store.stats()['resident_bytes'] <= store.max_bytes
+
+
+def test_reads_without_promote_leave_the_lru_alone(store):
+    expected = fill(store)
+    resident = list(store._resident)
+    cold = next(post_id for post_id in expected if post_id not in store._resident)
+
+    assert store.content(cold, promote=False) == expected[cold][0]
+    assert store.comments(cold, promote=False) == expected[cold][1]
+    assert list(store._resident) == resident
+
+
+def test_changing_cold_bodies(store):
+    expected = fill(store)
+    for post_id in range(0, 200, 3):
+        store.set_content(post_id, f'edited {post_id}')
+        store.add_comment(post_id, comment(post_id, 99))
+        comments = expected[post_id][1]
+        expected[post_id] = (f'edited {post_id}', comments + [comment(post_id, 99)])
+
+    assert store.stats()['garbage_bytes'] > 0
+    for post_id, (content, comments) in expected.items():
+        assert store.content(post_id) == content
+        assert store.comments(post_id) == comments
+
+
+def test_compaction_keeps_every_live_body(store, monkeypatch):
+    monkeypatch.setattr(blog_bodies, 'MIN_COMPACT_BYTES', 0)
+    expected = fill(store)
+    for round_ in range(5):
+        for post_id in expected:
+            store.set_content(post_id, f'round {round_} post {post_id} ' * 20)
+            expected[post_id] = (f'round {round_} post {post_id} ' * 20, expected[post_id][1])
+
+    stats = store.stats()
+    assert stats['compactions'] > 0
+    assert stats['garbage_bytes'] < stats['file_bytes']
+    for post_id, (content, comments) in expected.items():
+        assert store.content(post_id, promote=False) == content
+        assert store.comments(post_id, promote=False) == comments
+
+
+def test_snapshot_sees_bodies_as_they_were(store, monkeypatch):
+    monkeypatch.setattr(blog_bodies, 'MIN_COMPACT_BYTES', 0)
+    expected = fill(store)
+    snapshot = store.snapshot(list(expected) + ['unknown'])
+    # Change everything, enough to compact the spill file underneath it
+    for post_id in expected:
+        store.set_content(post_id, 'changed')
+        store.add_comment(post_id, comment(post_id, 99))
+    assert store.stats()['compactions'] > 0
+
+    restored = {post_id: pickle.loads(data) for post_id, data in snapshot}
+    assert restored.pop('unknown') == ('', [])
+    assert restored == expected
+
+
+def test_no_budget_writes_nothing(tmp_path):
+    store = BodyStore(str(tmp_path))
+    expected = fill(store)
+    assert store.stats()['disk_posts'] == 0 and store.stats()['file_bytes'] == 0
+    assert all(store.content(post_id) == content for post_id, (content, _) in expected.items())
@@ -0,0 +1,70 @@
+import pytest
+
+from blog_cache import PageCache
+from conftest import log_in
+
+
+def test_put_after_an_invalidation_is_dropped():
+    cache = PageCache()
+    generation = cache.generation
+    # The page was being rendered when a post on it changed
+    cache.invalidate(('post', '1'))
+    page = cache.put('home', b'stale', ['stats', ('post', '1')], generation)
+    assert page.body == b'stale'
+    assert cache.get('home') is None
+    cache.put('home', b'fresh', ['stats', ('post', '1')], cache.generation)
+    assert cache.get('home').body == b'fresh'
+
+
+def test_invalidate_drops_only_pages_with_the_tag():
+    cache = PageCache()
+    cache.put('first', b'1', ['stats', ('post', '1')], cache.generation)
+    cache.put('second', b'2', ['stats', ('post', '2')], cache.generation)
+    cache.invalidate(('post', '1'))
+    assert cache.get('first') is None
+    assert cache.get('second').body == b'2'
+    cache.invalidate('stats')
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = PageCache()
+    size = cache.put('a', b'x' * 1000, [], 0).size
+    cache.max_bytes = size * 2
+    cache.put('b', b'x' * 1000, [], 0)
+    cache.get('a')
+    cache.put('c', b'x' * 1000, [], 0)
+    assert cache.get('b') is None and cache.get('a') is not None
+    assert cache.evictions == 1
+
+
+@pytest.fixture
+def newest(blog_app):
+    (post,), _ = blog_app.posts.page(1, status='published')
+    previous = {name: post[name] for name in ('title', 'updated_at')}
+    yield post
+    blog_app.posts.update(post['id'], **previous)
+
+
+def test_editing_a_post_evicts_the_pages_showing_it(blog_app, client, newest):
+    client.get('/')
+    assert client.get('/').headers['X-Cache'] == 'HIT'
+    blog_app.posts.update(newest['id'], title='A renamed post', updated_at='2030-01-01 00:00:00')
+    response = client.get('/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'A renamed post' in response.data
+
+
+def test_liking_a_post_keeps_pages_without_it(blog_app, client, newest):
+    client.get('/?limit=1')
+    client.get('/')
+    member = blog_app.app.test_client()
+    log_in(member, '2', 'john_doe')
+    oldest = blog_app.posts.page(100, status='published')[0][-1]
+    assert oldest['id'] != newest['id']
+    try:
+        assert member.post(f"/api/posts/{oldest['id']}/like").status_code == 200
+        assert client.get('/?limit=1').headers['X-Cache'] == 'HIT'
+        assert client.get('/').headers['X-Cache'] == 'MISS'
+    finally:
+        member.delete(f"/api/posts/{oldest['id']}/like")
@@ -0,0 +1,58 @@
+import threading
+
+from blog_counters import ViewCounter
+
+
+class Totals:
+    def __init__(self):
+        self.views = {}
+        self.batches = 0
+
+    def __call__(self, increments):
+        self.batches += 1
+        for post_id, count in increments.items():
+            self.views[post_id] = self.views.get(post_id, 0) + count
+
+
+def test_no_views_lost_while_flushing_every_millisecond():
+    totals = Totals()
+    counter = ViewCounter(totals, interval=0.001)
+    threads, hits = 8, 100000
+
+    def view():
+        for i in range(hits):
+            counter.hit(str(i % 3))
+
+    counter.start()
+    workers = [threading.Thread(target=view) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    counter.stop()
+    assert sum(totals.views.values()) == threads * hits
+    assert totals.batches > 1
+
+
+def test_pending_counts_until_flushed():
+    totals = Totals()
+    counter = ViewCounter(totals)
+    for _ in range(3):
+        counter.hit('1')
+    assert counter.pending('1') == 3
+    assert counter.flush() == 3
+    assert counter.pending('1') == 0
+    assert totals.views == {'1': 3}
+    assert counter.flush() == 0
+    assert totals.batches == 1
+
+
+def test_shards_of_finished_threads_are_dropped_once_flushed():
+    totals = Totals()
+    counter = ViewCounter(totals)
+    worker = threading.Thread(target=counter.hit, args=('1',))
+    worker.start()
+    worker.join()
+    counter.flush()
+    assert totals.views == {'1': 1}
+    assert counter._shards == []
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from blog_jobs import JobQueue
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1)
+    yield queue
+    queue.stop(timeout=5)
+
+
+def block_worker(queue):
+    """Occupy the single worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def handler():
+        started.set()
+        release.wait(5)
+
+    queue.register('block', handler)
+    queue.enqueue('block')
+    assert started.wait(5)
+    return release
+
+
+def test_jobs_run_inline_before_start(queue):
+    ran = []
+    queue.register('note', ran.append)
+    queue.enqueue('note', 1, key='a')
+    queue.enqueue('note', 2, key='a')
+    assert ran == [1, 2]
+    assert queue.stats()['ran_inline'] == 2
+
+
+def test_waiting_jobs_with_the_same_key_coalesce(queue):
+    ran = []
+    queue.register('index', ran.append)
+    queue.start()
+    release = block_worker(queue)
+    for n in range(5):
+        queue.enqueue('index', n, key='post-1')
+    queue.enqueue('index', 'other', key='post-2')
+    release.set()
+    assert queue.join(5)
+
+    # The first copy queued stands for the later ones
+    assert ran == [0, 'other']
+    stats = queue.stats()['jobs']['index']
+    assert stats['coalesced'] == 4 and stats['completed'] == 2
+
+
+def test_uncoalesced_jobs_with_one_key_run_in_order(queue):
+    ran = []
+    queue.register('event', ran.append, coalesce=False)
+    queue.start()
+    release = block_worker(queue)
+    for n in range(5):
+        queue.enqueue('event', n, key='events')
+    release.set()
+    assert queue.join(5)
+    assert ran == [0, 1, 2, 3, 4]
+
+
+def test_failing_jobs_are_retried_with_backoff(queue):
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise OSError('not yet')
+
+    queue.register('flaky', flaky, retries=3, backoff=0.05)
+    queue.register('broken', lambda: 1 / 0, retries=2, backoff=0.01)
+    queue.start()
+    queue.enqueue('flaky', key='x')
+    queue.enqueue('broken')
+    assert queue.join(5)
+
+    assert len(attempts) == 3
+    assert attempts[1] - attempts[0] >= 0.05 and attempts[2] - attempts[1] >= 0.1
+    stats = queue.stats()['jobs']
+    assert (stats['flaky']['retried'], stats['flaky']['completed']) == (2, 1)
+    assert (stats['broken']['retried'], stats['broken']['failed']) == (2, 1)
+    assert stats['broken']['last_error_type'] == 'ZeroDivisionError'
+    assert 'last_error' not in stats['broken']
+
+
+def test_stop_drains_queued_jobs_and_retries(queue):
+    ran, failures = [], []
+
+    def once_failing(n):
+        if n == 0 and not failures:
+            failures.append(n)
+            raise OSError('retry me')
+        ran.append(n)
+
+    queue.register('work', once_failing, backoff=60)
+    queue.start()
+    release = block_worker(queue)
+    for n in range(10):
+        queue.enqueue('work', n)
+    release.set()
+    started = time.monotonic()
+    queue.stop(timeout=5)
+
+    # The retry is run at once rather than after its 60s backoff
+    assert sorted(ran) == list(range(10))
+    assert time.monotonic() - started < 5
+    assert len(queue) == 0
+
+    # Once stopped, jobs run in the caller
+    queue.enqueue('work', 'late')
+    assert ran[-1] == 'late'
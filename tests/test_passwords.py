@@ -0,0 +1,33 @@
+import os
+import signal
+
+import pytest
+
+from blog_passwords import HasherBusy, PasswordHasher, verify_password
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1)
+    hasher.start()
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify_in_the_pool(hasher):
+    stored = hasher.hash('secret')
+    assert hasher.verify('secret', stored) == (True, None)
+    assert hasher.verify('wrong', stored) == (False, None)
+    assert verify_password('secret', stored) == (True, None)
+
+
+def test_dead_workers_fail_one_job_then_the_pool_is_rebuilt(hasher):
+    for pid in list(hasher._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    with pytest.raises(HasherBusy):
+        for _ in range(2):
+            # The first job may be submitted before the pool notices
+            hasher.hash('secret')
+    assert hasher.restarts == 1
+    assert hasher.verify('secret', hasher.hash('secret'))[0]
+    assert hasher.pending == 0
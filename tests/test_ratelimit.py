@@ -0,0 +1,80 @@
+import pytest
+
+import blog_ratelimit
+from blog_ratelimit import RateLimitPolicy, TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(blog_ratelimit.time, 'monotonic', clock)
+    return clock
+
+
+def test_burst_then_wait_for_the_next_token():
+    limiter = TokenBucketLimiter(rate=2.0, burst=3)
+    assert [limiter.acquire('a', now=10.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire('a', now=10.0) == pytest.approx(0.5)
+    # A quarter of a token has come back; the rest takes another 0.375 s
+    assert limiter.acquire('a', now=10.125) == pytest.approx(0.375)
+    assert limiter.acquire('a', now=10.5) == 0.0
+    assert (limiter.allowed, limiter.limited) == (4, 2)
+
+
+def test_refill_is_capped_at_the_burst():
+    limiter = TokenBucketLimiter(rate=1.0, burst=2)
+    limiter.acquire('a', now=0.0)
+    limiter.acquire('a', now=0.0)
+    # An hour idle still only earns back the burst
+    results = [limiter.acquire('a', now=3600.0) for _ in range(3)]
+    assert results[:2] == [0.0, 0.0] and results[2] == pytest.approx(1.0)
+
+
+def test_keys_have_their_own_buckets():
+    limiter = TokenBucketLimiter(rate=1.0, burst=1)
+    assert limiter.acquire('a', now=0.0) == 0.0
+    assert limiter.acquire('a', now=0.0) > 0
+    assert limiter.acquire('b', now=0.0) == 0.0
+
+
+def test_least_recently_used_key_is_dropped_and_comes_back_full():
+    limiter = TokenBucketLimiter(rate=1.0, burst=1, max_keys=2)
+    limiter.acquire('a', now=0.0)
+    limiter.acquire('b', now=0.0)
+    limiter.acquire('a', now=0.0)
+    limiter.acquire('c', now=0.0)
+    assert len(limiter) == 2 and limiter.evictions == 1
+    assert limiter.acquire('b', now=0.0) == 0.0
+    assert limiter.acquire('c', now=0.0) > 0
+
+
+def test_retry_after_is_whole_seconds_and_at_least_one(clock):
+    policy = RateLimitPolicy(per_ip=TokenBucketLimiter(rate=1 / 60, burst=2))
+    assert policy.check('1.2.3.4') == 0
+    assert policy.check('1.2.3.4') == 0
+    assert policy.check('1.2.3.4') == 60
+    clock.now += 59.5
+    assert policy.check('1.2.3.4') == 1
+    clock.now += 0.5
+    assert policy.check('1.2.3.4') == 0
+
+
+def test_session_bucket_only_charged_once_the_ip_is_allowed(clock):
+    per_ip = TokenBucketLimiter(rate=1.0, burst=1)
+    per_session = TokenBucketLimiter(rate=0.1, burst=2)
+    policy = RateLimitPolicy(per_ip, per_session)
+    assert policy.check('1.2.3.4', 'u1') == 0
+    assert policy.check('1.2.3.4', 'u1') == 1
+    assert per_session.stats()['allowed'] == 1 and per_session.stats()['limited'] == 0
+    assert policy.check('5.6.7.8', 'u1') == 0
+    assert policy.check('9.9.9.9', 'u1') == 10
+    # Requests without a session only count against their IP
+    assert policy.check('7.7.7.7') == 0
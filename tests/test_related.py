@@ -0,0 +1,68 @@
+import heapq
+import random
+
+from blog_related import RelatedPosts
+
+TAGS = [f'tag{i}' for i in range(8)]
+
+
+def brute_force(posts, post_id, k):
+    """Top k by Jaccard similarity of tags over every other post, newest first on ties"""
+    tags = {tag.lower() for tag in posts[post_id]['tags']}
+    if not tags:
+        return []
+    scored = []
+    for other_id, other in posts.items():
+        other_tags = {tag.lower() for tag in other['tags']}
+        shared = len(tags & other_tags)
+        if other_id != post_id and shared:
+            scored.append((shared / len(tags | other_tags), other['created_at'], other_id))
+    return [(other_id, score) for score, _, other_id in heapq.nlargest(k, scored)]
+
+
+def make_post(rng, i):
+    return {'id': f'p{i}', 'tags': rng.sample(TAGS, rng.randrange(4)),
+            'created_at': f'2024-01-01 00:{rng.randrange(60):02d}:{i % 60:02d}'}
+
+
+def test_lists_match_brute_force_through_edits_and_removals():
+    rng = random.Random(11)
+    # A window as large as the store makes every post a candidate
+    related, posts = RelatedPosts(k=5, window=1000), {}
+    for step in range(1500):
+        post_id = f'p{rng.randrange(150)}'
+        if post_id in posts and rng.random() < 0.2:
+            related.remove(post_id)
+            del posts[post_id]
+        else:
+            post = make_post(rng, int(post_id[1:]))
+            if post_id in posts and rng.random() < 0.5:
+                # Same post, new tags
+                post['created_at'] = posts[post_id]['created_at']
+            related.add(post)
+            posts[post_id] = post
+        if step % 100 == 0:
+            for checked in posts:
+                assert related.related(checked) == brute_force(posts, checked, 5)
+    for checked in posts:
+        assert related.related(checked) == brute_force(posts, checked, 5)
+
+
+def test_add_many_matches_adding_one_at_a_time():
+    rng = random.Random(5)
+    posts = [make_post(rng, i) for i in range(200)]
+    one_by_one, batched = RelatedPosts(k=3, window=20), RelatedPosts(k=3, window=20)
+    for post in posts:
+        one_by_one.add(post)
+    batched.add_many(posts)
+    for post in posts:
+        assert batched.related(post['id']) == one_by_one.related(post['id'])
+
+
+def test_tags_compare_case_insensitively():
+    related = RelatedPosts(k=5)
+    related.add({'id': '1', 'tags': ['Python', 'flask'], 'created_at': '2024-01-01'})
+    related.add({'id': '2', 'tags': ['python', 'FLASK'], 'created_at': '2024-01-02'})
+    related.add({'id': '3', 'tags': [], 'created_at': '2024-01-03'})
+    assert related.related('1') == [('2', 1.0)]
+    assert related.related('3') == []
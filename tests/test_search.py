@@ -0,0 +1,103 @@
+import heapq
+import math
+import random
+
+import pytest
+
+from blog_search import FIELD_WEIGHTS, SearchIndex, _field_text, parse_query, tokenize
+
+# A skewed vocabulary, so some terms are in nearly every post and some in few
+WORDS = [f'w{i}' for i in range(60)]
+WORD_WEIGHTS = [1 / (rank + 1) for rank in range(60)]
+TAGS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon']
+
+QUERIES = [
+    'w0', 'w1 w2', 'w5 w9 w0', 'w30', 'w59 w58', '"w1 w2"', '"w1 w2 w3" w0',
+    '"w0 w0"', 'w3 tag:beta', 'tag:gamma', '"w1 nothere"', 'nothere',
+]
+
+
+class Oracle:
+    """BM25 over field-weighted term counts, recomputed from scratch per query"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.posts = {}
+
+    def search(self, query, k):
+        terms, phrases, tags = parse_query(query)
+        terms = list(dict.fromkeys(terms + [t for phrase in phrases for t in phrase]))
+        docs = {}
+        for post_id, post in self.posts.items():
+            fields = [tokenize(_field_text(post, field)) for field, _ in FIELD_WEIGHTS]
+            counts = {}
+            for tokens, (_, weight) in zip(fields, FIELD_WEIGHTS):
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + weight
+            docs[post_id] = (counts, sum(counts.values()), fields, {t.lower() for t in post['tags']})
+        avg_length = sum(length for _, length, _, _ in docs.values()) / len(docs)
+        found = []
+        for post_id, (counts, length, fields, post_tags) in docs.items():
+            if not all(t in counts for t in terms) or not all(t in post_tags for t in tags):
+                continue
+            if not all(any(tokens[i:i + len(phrase)] == phrase for tokens in fields for i in range(len(tokens)))
+                       for phrase in phrases):
+                continue
+            score = 0.0
+            for term in terms:
+                df = sum(1 for other in docs.values() if term in other[0])
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                tf = counts[term]
+                score += idf * (self.k1 + 1) * tf / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+            found.append((score, post_id))
+        return len(found), heapq.nlargest(k, found)
+
+
+def make_post(rng, i):
+    return {
+        'id': str(i),
+        'title': ' '.join(rng.choices(WORDS[:8], k=rng.randint(0, 6))),
+        'content': ' '.join(rng.choices(WORDS, WORD_WEIGHTS, k=rng.randint(1, 150))),
+        'tags': rng.sample(TAGS, 2),
+    }
+
+
+@pytest.fixture(scope='module')
+def indexes():
+    rng = random.Random(1)
+    index, oracle = SearchIndex(cache_size=0), Oracle()
+    posts = [make_post(rng, i) for i in range(400)]
+    index.add_many(posts)
+    oracle.posts = {post['id']: post for post in posts}
+    # Edits and removals leave stale impact entries behind for the search to skip
+    for _ in range(1500):
+        post = rng.choice(posts)
+        if rng.random() < 0.3:
+            index.remove(post['id'])
+            oracle.posts.pop(post['id'], None)
+        else:
+            post = make_post(rng, int(post['id']))
+            index.add(post)
+            oracle.posts[post['id']] = post
+    return index, oracle
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('page', [1, 3])
+def test_results_match_brute_force(indexes, query, page):
+    index, oracle = indexes
+    found = index.search(query, page=page, per_page=10)
+    total, expected = oracle.search(query, page * 10)
+    assert found['total'] == total
+    got = [(post['id'], round(score, 9)) for post, score in found['results']]
+    assert got == [(post_id, round(score, 9)) for score, post_id in expected[(page - 1) * 10:]]
+
+
+def test_phrase_needs_adjacent_terms_in_one_field():
+    index = SearchIndex()
+    index.add({'id': '1', 'title': 'flask', 'content': 'tips and tricks', 'tags': []})
+    index.add({'id': '2', 'title': 'Flask tips', 'content': 'nothing here', 'tags': []})
+    index.add({'id': '3', 'title': 'tips', 'content': 'flask', 'tags': []})
+    assert [post['id'] for post, _ in index.search('"flask tips"')['results']] == ['2']
+    assert index.search('"flask missing"')['total'] == 0
@@ -0,0 +1,141 @@
+import errno
+import os
+import pickle
+
+import pytest
+
+import blog_storage
+from blog_storage import SNAPSHOT_NAME, EventLog, EventLogFailed
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith('log.'))
+
+
+def reopen(directory):
+    log = EventLog(str(directory))
+    state, records = log.load()
+    return log, state, records
+
+
+def test_records_survive_a_restart(tmp_path):
+    log, state, records = reopen(tmp_path)
+    assert state is None and records == []
+    for i in range(100):
+        log.append({'op': 'n', 'i': i})
+    log.sync()
+    log.close()
+
+    log, state, records = reopen(tmp_path)
+    assert state is None
+    assert [record['i'] for record in records] == list(range(100))
+    log.close()
+
+
+def test_torn_tail_is_ignored_and_never_appended_to(tmp_path):
+    log, _, _ = reopen(tmp_path)
+    for i in range(3):
+        log.append({'op': 'n', 'i': i})
+    log.close()
+    # A crash in the middle of a write leaves half a line behind
+    last = os.path.join(tmp_path, segment_files(tmp_path)[-1])
+    with open(last, 'ab') as f:
+        f.write(b'{"op":"n","i":')
+
+    log, _, records = reopen(tmp_path)
+    assert [record['i'] for record in records] == [0, 1, 2]
+    log.append({'op': 'n', 'i': 3})
+    log.close()
+
+    log, _, records = reopen(tmp_path)
+    assert [record['i'] for record in records] == [0, 1, 2, 3]
+    log.close()
+
+
+def test_snapshot_replaces_older_segments(tmp_path):
+    log, _, _ = reopen(tmp_path)
+    for i in range(5):
+        log.append({'op': 'n', 'i': i})
+
+    def capture(rotate):
+        segment = rotate()
+        blobs = [(key, pickle.dumps(key * 10)) for key in range(3)]
+        return segment, {'upto': 4}, iter(blobs)
+
+    log.snapshot(capture)
+    log.append({'op': 'n', 'i': 5})
+    log.close()
+    assert os.path.exists(os.path.join(tmp_path, SNAPSHOT_NAME))
+    assert len(segment_files(tmp_path)) == 1
+
+    log, state, records = reopen(tmp_path)
+    assert state == {'upto': 4}
+    assert [record['i'] for record in records] == [5]
+    assert list(log.snapshot_blobs()) == [(0, 0), (1, 10), (2, 20)]
+    log.close()
+
+
+def test_failed_snapshot_keeps_every_record(tmp_path):
+    log, _, _ = reopen(tmp_path)
+    log.append({'op': 'n', 'i': 0})
+
+    def capture(rotate):
+        rotate()
+        raise RuntimeError('crashed while copying the state')
+
+    with pytest.raises(RuntimeError):
+        log.snapshot(capture)
+    log.append({'op': 'n', 'i': 1})
+    log.close()
+    assert len(segment_files(tmp_path)) == 2
+
+    log, state, records = reopen(tmp_path)
+    assert state is None
+    assert [record['i'] for record in records] == [0, 1]
+    log.close()
+
+
+def test_segments_left_by_an_interrupted_snapshot_are_dropped(tmp_path):
+    log, _, _ = reopen(tmp_path)
+    log.append({'op': 'n', 'i': 0})
+    log.snapshot(lambda rotate: (rotate(), {'upto': 0}, ()))
+    log.append({'op': 'n', 'i': 1})
+    log.close()
+    # As if the process died after writing the snapshot but before
+    # deleting the segment it covers
+    with open(os.path.join(tmp_path, 'log.00000000.jsonl'), 'wb') as f:
+        f.write(b'{"op":"n","i":0}\n')
+
+    log, state, records = reopen(tmp_path)
+    assert state == {'upto': 0}
+    assert [record['i'] for record in records] == [1]
+    assert 'log.00000000.jsonl' not in segment_files(tmp_path)
+    log.close()
+
+
+def test_snapshots_without_blobs_still_load(tmp_path):
+    with open(os.path.join(tmp_path, SNAPSHOT_NAME), 'wb') as f:
+        pickle.dump({'segment': 1, 'state': {'posts': []}}, f)
+
+    log, state, records = reopen(tmp_path)
+    assert state == {'posts': []} and records == []
+    assert list(log.snapshot_blobs()) == []
+    log.close()
+
+
+def test_failed_fsync_makes_sync_raise_instead_of_hanging(tmp_path, monkeypatch):
+    log, _, _ = reopen(tmp_path)
+    log.append({'op': 'first'})
+    log.sync()
+
+    def fsync(fd):
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    monkeypatch.setattr(blog_storage.os, 'fsync', fsync)
+    sequence = log.append({'op': 'second'})
+    with pytest.raises(EventLogFailed):
+        log.sync(sequence)
+    assert isinstance(log.failure, OSError)
+    # Records already durable still count as synced
+    log.sync(1)
+    log.close()
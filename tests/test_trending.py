@@ -0,0 +1,103 @@
+import math
+import random
+from datetime import datetime
+
+import pytest
+
+import blog_trending
+from blog_trending import POST_WEIGHT, TrendingRanking
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1.7e9)
+    monkeypatch.setattr(blog_trending.time, 'time', clock)
+    return clock
+
+
+class Oracle:
+    """Every score decayed from its last event, the slow obvious way"""
+
+    def __init__(self, half_life):
+        self.half_life = half_life
+        self.scores = {}
+
+    def decayed(self, post_id, now):
+        score, at = self.scores[post_id]
+        return score * 2 ** (-(now - at) / self.half_life)
+
+    def add(self, post_id, amount, now):
+        if post_id in self.scores:
+            self.scores[post_id] = (max(self.decayed(post_id, now) + amount, 0.0), now)
+
+    def top(self, n, now):
+        ranked = sorted(((self.decayed(post_id, now), post_id) for post_id in self.scores),
+                        key=lambda entry: (-entry[0], entry[1]))
+        return ranked[:n]
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def test_top_matches_brute_force(clock):
+    rng = random.Random(7)
+    ranking, oracle = TrendingRanking(half_life=3600.0), Oracle(3600.0)
+    for step in range(3000):
+        # Hours go by between some events, days between a few, so the epoch
+        # has to be rebased along the way
+        clock.now += rng.choice((0.5, 30.0, 600.0, 3600.0 * 30))
+        post_id = f'p{rng.randrange(60)}'
+        if rng.random() < 0.1:
+            ranking.seed({'id': post_id, 'created_at': iso(clock.now)})
+            oracle.scores[post_id] = (POST_WEIGHT, clock.now)
+        elif rng.random() < 0.05:
+            ranking.remove(post_id)
+            oracle.scores.pop(post_id, None)
+        else:
+            amount = rng.uniform(-3.0, 10.0)
+            ranking.add(post_id, amount)
+            oracle.add(post_id, amount, clock.now)
+
+        if step % 50 == 0:
+            expected = oracle.top(10, clock.now)
+            found = ranking.top(10)
+            assert len(found) == len(expected)
+            assert [post_id for post_id, _ in found] == [post_id for _, post_id in expected]
+            for (post_id, score), (expected_score, _) in zip(found, expected):
+                assert math.isclose(score, expected_score, rel_tol=1e-9, abs_tol=1e-300)
+                assert math.isclose(ranking.score(post_id), oracle.decayed(post_id, clock.now),
+                                     rel_tol=1e-9, abs_tol=1e-300)
+    assert ranking._epoch > 1.7e9
+
+
+def test_future_dates_count_as_now(clock):
+    ranking = TrendingRanking(half_life=3600.0)
+    ranking.seed({'id': 'future', 'created_at': '2999-01-01T00:00:00', 'views': 10})
+    ranking.seed({'id': 'today', 'created_at': iso(clock.now)})
+    ranking.add('today', 1.0, at=clock.now + 10 ** 9)
+
+    assert ranking._epoch <= clock.now
+    clock.now += 3600.0
+    scores = dict(ranking.top(5))
+    assert math.isclose(scores['future'], (POST_WEIGHT + 10) / 2)
+    assert math.isclose(scores['today'], (POST_WEIGHT + 1) / 2)
+
+
+def test_rebuild_seeds_only_published_posts(clock):
+    ranking = TrendingRanking()
+    ranking.rebuild([
+        {'id': '1', 'status': 'published', 'created_at': iso(clock.now)},
+        {'id': '2', 'status': 'draft', 'created_at': iso(clock.now)},
+    ])
+    assert [post_id for post_id, _ in ranking.top(5)] == ['1']
+    ranking.add('2', 100.0)
+    assert ranking.score('2') == 0.0
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import blog_versions
+from conftest import log_in
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def advance(self, seconds):
+        self.now = self.now.fromtimestamp(self.now.timestamp() + seconds, timezone.utc)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(datetime(2026, 1, 1, 12, 0, 0, 200000, tzinfo=timezone.utc))
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.now
+
+    monkeypatch.setattr(blog_versions, 'datetime', FrozenDatetime)
+    return clock
+
+
+@pytest.fixture
+def member(client):
+    log_in(client, '2', 'john_doe')
+    yield client
+    client.delete('/api/posts/1/like')
+
+
+def test_matching_etag_gets_304(client):
+    first = client.get('/api/posts/1')
+    assert first.status_code == 200
+    again = client.get('/api/posts/1', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_write_changes_the_etag(member):
+    etag = member.get('/api/posts/1').headers['ETag']
+    assert member.post('/api/posts/1/like').status_code == 200
+    changed = member.get('/api/posts/1', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()['likes'] == member.get('/api/posts/1').get_json()['likes']
+    assert changed.headers['ETag'] != etag
+    assert member.get('/api/posts/1', headers={'If-None-Match': changed.headers['ETag']}).status_code == 304
+
+
+def test_no_304_from_a_date_a_later_write_can_share(member, clock):
+    member.post('/api/posts/1/like')
+    written = format_datetime(clock.now.replace(microsecond=0), usegmt=True)
+    response = member.get('/api/posts/1')
+    assert 'Last-Modified' not in response.headers
+
+    # A second write in the same second gets the same Last-Modified date
+    clock.advance(0.5)
+    member.delete('/api/posts/1/like')
+    response = member.get('/api/posts/1', headers={'If-Modified-Since': written})
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
+
+    # Once the second is over the date is safe to hand out and to match
+    clock.advance(1)
+    assert member.get('/api/posts/1').headers['Last-Modified'] == written
+    assert member.get('/api/posts/1', headers={'If-Modified-Since': written}).status_code == 304